@@ -8,8 +8,10 @@ from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
 from logistics import routing
+from logistics.apps import start_route_graph_warmup
 
 django_asgi_app = get_asgi_application()
+start_route_graph_warmup()
 
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
@@ -29,6 +29,7 @@ INSTALLED_APPS = [
     'rest_framework',
     'corsheaders',
     'django_fsm',
+    'django_filters',
     'channels',
     
     # Local apps
@@ -69,11 +70,20 @@ ASGI_APPLICATION = 'config.asgi.application'
 
 # Database
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': env.db('DATABASE_URL', default='sqlite:///db.sqlite3'),
 }
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['default']['NAME'] = BASE_DIR / DATABASES['default']['NAME']
+
+# Connection pooling: in production point DATABASE_URL at PgBouncer running in
+# transaction-pooling mode so the uvicorn workers and Celery workers share a small
+# set of Postgres connections. Django then opens a cheap connection to the
+# pooler per request (CONN_MAX_AGE=0) instead of holding one per worker thread.
+DATABASES['default']['CONN_MAX_AGE'] = env.int('CONN_MAX_AGE', default=0)
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+if env.bool('DB_PGBOUNCER', default=False):
+    # Server-side cursors don't survive transaction pooling
+    DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -98,11 +108,14 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'drf_orjson_renderer.renderers.ORJSONRenderer',
     ],
     'DEFAULT_PARSER_CLASSES': [
         'rest_framework.parsers.JSONParser',
     ],
+    'DEFAULT_FILTER_BACKENDS': [
+        'django_filters.rest_framework.DjangoFilterBackend',
+    ],
 }
 
 # CORS Settings
@@ -121,10 +134,26 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Cache (shared route graph and route results)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://127.0.0.1:6379/1',
+    }
+}
+
 # Celery Configuration
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
 CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
-CELERY_ACCEPT_CONTENT = ['json']
-CELERY_TASK_SERIALIZER = 'json'
-CELERY_RESULT_SERIALIZER = 'json'
-CELERY_TIMEZONE = 'UTC'
\ No newline at end of file
+# msgpack for task payloads and route results; json is still accepted
+# for messages queued before the switch
+CELERY_ACCEPT_CONTENT = ['msgpack', 'json']
+CELERY_TASK_SERIALIZER = 'msgpack'
+CELERY_RESULT_SERIALIZER = 'msgpack'
+CELERY_TIMEZONE = 'UTC'
+
+# Precompute all-pairs shortest paths for networks smaller than this
+APSP_MAX_NODES = env.int('APSP_MAX_NODES', default=2000)
+
+# Seconds of artificial delay in update_package_location (0 disables it)
+SIMULATE_PACKAGE_LATENCY = env.float('SIMULATE_PACKAGE_LATENCY', default=0)
\ No newline at end of file
@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_wsgi_application()
+
+from logistics.apps import start_route_graph_warmup  # noqa: E402
+
+start_route_graph_warmup()
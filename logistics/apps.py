@@ -1,6 +1,54 @@
+import logging
+import threading
+import time
+
+from celery.signals import worker_process_init
 from django.apps import AppConfig
 
 
+logger = logging.getLogger(__name__)
+
+# Give the process a moment to finish starting before touching the database
+GRAPH_WARMUP_DELAY = 2
+
+
+def _warm_route_graph():
+    from .services import graph_engine
+    from .services.graph_engine import ROUTE_CALCULATOR
+
+    if graph_engine.jit_dijkstra is not None:
+        # Compile the Numba searches before the first request does
+        graph_engine.jit_dijkstra.warm_up()
+
+    time.sleep(GRAPH_WARMUP_DELAY)
+    try:
+        ROUTE_CALCULATOR.build_graph()
+    except Exception:
+        # Cold database (e.g. during migrate) or cache unavailable; the
+        # graph is still built lazily on the first route request
+        logger.warning('Route graph warm-up skipped', exc_info=True)
+
+
+def start_route_graph_warmup():
+    """
+    Build the route graph in the background of a process that serves routes.
+
+    Called from the ASGI/WSGI entry points and in each Celery pool process
+    rather than from ready(), so migrate, shell, the test runner and the
+    prefork parent never start it; they build the graph lazily if at all.
+    """
+    threading.Thread(target=_warm_route_graph, name='route-graph-warmup', daemon=True).start()
+
+
+@worker_process_init.connect
+def _warm_worker_process(**kwargs):
+    start_route_graph_warmup()
+
+
 class LogisticsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'logistics'
+
+    def ready(self):
+        # Register signal handlers that keep the cached route graph fresh
+        from . import signals  # noqa: F401
@@ -1,10 +1,59 @@
-import json
+import asyncio
+
+import msgpack
+import orjson
+from asgiref.sync import sync_to_async
+from celery.result import AsyncResult
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from .models import Package
+from .services.broadcast import build_route_snapshot, pack_message
+
+
+# Clients offering this subprotocol get binary MessagePack frames
+MSGPACK_SUBPROTOCOL = 'msgpack'
+
+# Seconds a task status socket waits for a result before giving up
+TASK_STATUS_TIMEOUT = 300
 
+# state -> human readable label, resolved once instead of per message
+PACKAGE_STATE_LABELS = dict(Package._meta.get_field('state').choices)
 
-class PackageTrackingConsumer(AsyncWebsocketConsumer):
+
+class FramedWebsocketConsumer(AsyncWebsocketConsumer):
+    """
+    Base consumer that speaks MessagePack or JSON depending on the client.
+    
+    Clients that connect with the 'msgpack' subprotocol send and receive
+    binary frames (decode with msgpack.unpackb(frame)); all other clients
+    keep receiving JSON text frames.
+    """
+    use_msgpack = False
+    
+    async def accept_framed(self):
+        self.use_msgpack = MSGPACK_SUBPROTOCOL in self.scope.get('subprotocols', [])
+        await self.accept(subprotocol=MSGPACK_SUBPROTOCOL if self.use_msgpack else None)
+    
+    async def send_message(self, message):
+        if self.use_msgpack:
+            await self.send(bytes_data=pack_message(message))
+        else:
+            await self.send(text_data=orjson.dumps(message).decode())
+    
+    async def send_encoded(self, event):
+        """Forward a frame the producer already serialized for us"""
+        if self.use_msgpack:
+            await self.send(bytes_data=event['msgpack'])
+        else:
+            await self.send(text_data=event['json'])
+    
+    def decode_message(self, text_data=None, bytes_data=None):
+        if bytes_data is not None:
+            return msgpack.unpackb(bytes_data, raw=False)
+        return orjson.loads(text_data)
+
+
+class PackageTrackingConsumer(FramedWebsocketConsumer):
     """
     WebSocket consumer for real-time package tracking.
     
@@ -21,15 +70,15 @@ class PackageTrackingConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
         
-        await self.accept()
+        await self.accept_framed()
         
         # Send initial package data
         package_data = await self.get_package_data()
         if package_data:
-            await self.send(text_data=json.dumps({
+            await self.send_message({
                 'type': 'package_status',
                 'data': package_data
-            }))
+            })
     
     async def disconnect(self, close_code):
         # Leave tracking room
@@ -38,60 +87,73 @@ class PackageTrackingConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
     
-    async def receive(self, text_data):
+    async def receive(self, text_data=None, bytes_data=None):
         """Handle messages from WebSocket client"""
-        data = json.loads(text_data)
+        data = self.decode_message(text_data, bytes_data)
         message_type = data.get('type')
         
         if message_type == 'request_update':
             # Client requested current status
             package_data = await self.get_package_data()
             if package_data:
-                await self.send(text_data=json.dumps({
+                await self.send_message({
                     'type': 'package_status',
                     'data': package_data
-                }))
+                })
     
     async def package_update(self, event):
         """Receive message from room group"""
-        await self.send(text_data=json.dumps({
+        await self.send_message({
             'type': 'package_update',
             'data': event['data']
-        }))
+        })
+    
+    async def package_update_raw(self, event):
+        """Receive a pre-serialized message from room group"""
+        await self.send_encoded(event)
     
     @database_sync_to_async
     def get_package_data(self):
         """Fetch package data from database"""
-        try:
-            package = Package.objects.select_related(
-                'origin', 'current_location', 'destination'
-            ).get(tracking_id=self.tracking_id)
-            
-            return {
-                'tracking_id': package.tracking_id,
-                'state': package.state,
-                'state_display': package.get_state_display(),
-                'origin': package.origin.name,
-                'current_location': package.current_location.name,
-                'destination': package.destination.name,
-                'current_coordinates': {
-                    'latitude': float(package.current_location.latitude),
-                    'longitude': float(package.current_location.longitude)
-                },
-                'weight_kg': package.weight_kg,
-                'description': package.description,
-                'created_at': package.created_at.isoformat(),
-                'updated_at': package.updated_at.isoformat()
-            }
-        except Package.DoesNotExist:
+        row = Package.objects.filter(tracking_id=self.tracking_id).values(
+            'tracking_id', 'state',
+            'origin__name', 'current_location__name', 'destination__name',
+            'current_location__latitude', 'current_location__longitude',
+            'weight_kg', 'description', 'created_at', 'updated_at'
+        ).first()
+        
+        if row is None:
             return None
+        
+        return {
+            'tracking_id': row['tracking_id'],
+            'state': row['state'],
+            'state_display': PACKAGE_STATE_LABELS.get(row['state'], row['state']),
+            'origin': row['origin__name'],
+            'current_location': row['current_location__name'],
+            'destination': row['destination__name'],
+            'current_coordinates': {
+                'latitude': row['current_location__latitude'],
+                'longitude': row['current_location__longitude']
+            },
+            'weight_kg': row['weight_kg'],
+            'description': row['description'],
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at']
+        }
 
 
-class RouteVisualizationConsumer(AsyncWebsocketConsumer):
+class RouteVisualizationConsumer(FramedWebsocketConsumer):
     """
     WebSocket consumer for real-time route visualization updates.
     
     Connect to: ws://localhost:8000/ws/routes/
+    
+    A 'route_snapshot' with every edge status and moving package position
+    is sent on connect; after that only 'route_delta' messages for what
+    changed are pushed. A route_delta's data is a single change, or a list
+    of them for bulk package moves. Deleted edges arrive with status None,
+    and packages that stop moving as {'tracking_id': ..., 'removed': True}.
     """
     
     async def connect(self):
@@ -103,7 +165,14 @@ class RouteVisualizationConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
         
-        await self.accept()
+        await self.accept_framed()
+        
+        # Send the full state once; deltas follow from the group
+        snapshot = await database_sync_to_async(build_route_snapshot)()
+        await self.send_message({
+            'type': 'route_snapshot',
+            'data': snapshot
+        })
     
     async def disconnect(self, close_code):
         # Leave room
@@ -114,7 +183,87 @@ class RouteVisualizationConsumer(AsyncWebsocketConsumer):
     
     async def route_update(self, event):
         """Send route update to WebSocket"""
-        await self.send(text_data=json.dumps({
+        await self.send_message({
             'type': 'route_update',
             'data': event['data']
-        }))
\ No newline at end of file
+        })
+    
+    async def route_update_raw(self, event):
+        """Send a pre-serialized route update to WebSocket"""
+        await self.send_encoded(event)
+
+
+class TaskStatusConsumer(FramedWebsocketConsumer):
+    """
+    WebSocket consumer that pushes an async task's result when it finishes.
+    
+    Connect to: ws://localhost:8000/ws/tasks/{task_id}/
+    
+    Sends one 'task_complete' message (state SUCCESS or FAILURE) and
+    closes. If no result arrives within TASK_STATUS_TIMEOUT seconds the
+    socket is closed without one; /api/task-status/{id}/ remains as a
+    polling fallback.
+    """
+    
+    async def connect(self):
+        self.task_id = self.scope['url_route']['kwargs']['task_id']
+        self.room_group_name = f'task_{self.task_id}'
+        self.timeout = None
+        
+        # Subscribe before checking the backend so a result that lands in
+        # between is still pushed to us
+        await self.channel_layer.group_add(
+            self.room_group_name,
+            self.channel_name
+        )
+        
+        await self.accept_framed()
+        
+        # The task may have finished before the client connected
+        message = await self.get_finished_task()
+        if message:
+            await self.send_message(message)
+            await self.close()
+        else:
+            self.timeout = asyncio.create_task(self.close_after_timeout())
+    
+    async def disconnect(self, close_code):
+        if self.timeout is not None:
+            self.timeout.cancel()
+        
+        await self.channel_layer.group_discard(
+            self.room_group_name,
+            self.channel_name
+        )
+    
+    async def close_after_timeout(self):
+        """Stop waiting on a task that never reported back"""
+        await asyncio.sleep(TASK_STATUS_TIMEOUT)
+        
+        # Last look in case its push was lost
+        message = await self.get_finished_task()
+        if message:
+            await self.send_message(message)
+        await self.close()
+    
+    async def task_complete_raw(self, event):
+        """Send the pre-serialized result and hang up"""
+        await self.send_encoded(event)
+        await self.close()
+    
+    @sync_to_async
+    def get_finished_task(self):
+        """Read an already finished task from the result backend"""
+        meta = AsyncResult(self.task_id).backend.get_task_meta(self.task_id)
+        
+        if meta['status'] == 'SUCCESS':
+            data = {'task_id': self.task_id, 'state': meta['status'], 'result': meta['result']}
+        elif meta['status'] == 'FAILURE':
+            data = {'task_id': self.task_id, 'state': meta['status'], 'error': str(meta['result'])}
+        else:
+            return None
+        
+        return {
+            'type': 'task_complete',
+            'data': data
+        }
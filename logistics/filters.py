@@ -0,0 +1,48 @@
+from django_filters import rest_framework as filters
+
+from .models import LocationNode, Package, RouteEdge
+
+
+class LocationNodeFilter(filters.FilterSet):
+    """
+    Query parameters for LocationNodeViewSet.
+    
+    ?type=warehouse&active=true
+    """
+    
+    type = filters.CharFilter(field_name='node_type')
+    active = filters.BooleanFilter(field_name='is_active')
+    
+    class Meta:
+        model = LocationNode
+        fields = ['type', 'active']
+
+
+class RouteEdgeFilter(filters.FilterSet):
+    """
+    Query parameters for RouteEdgeViewSet.
+    
+    ?status=active&source=3
+    """
+    
+    status = filters.CharFilter(field_name='status')
+    source = filters.NumberFilter(field_name='source_id')
+    
+    class Meta:
+        model = RouteEdge
+        fields = ['status', 'source']
+
+
+class PackageFilter(filters.FilterSet):
+    """
+    Query parameters for PackageViewSet.
+    
+    ?state=in_transit&tracking_id=PKG-...
+    """
+    
+    state = filters.CharFilter(field_name='state')
+    tracking_id = filters.CharFilter(field_name='tracking_id')
+    
+    class Meta:
+        model = Package
+        fields = ['state', 'tracking_id']
@@ -0,0 +1,79 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from logistics.services.graph_engine import GraphState
+
+
+def grid_arrays(side: int, rng: np.random.Generator) -> dict:
+    """
+    Graph arrays, in RouteCalculator._load_from_db's layout, for a square
+    grid of side x side locations with two-way roads between neighbours.
+    """
+    n = side * side
+    rows, cols = np.divmod(np.arange(n), side)
+    right = np.flatnonzero(cols < side - 1)
+    down = np.flatnonzero(rows < side - 1)
+    sources = np.concatenate((right, right + 1, down, down + side))
+    targets = np.concatenate((right + 1, right, down + side, down))
+
+    order = np.argsort(sources, kind='stable')
+    indptr = np.zeros(n + 1, dtype=np.int32)
+    np.cumsum(np.bincount(sources, minlength=n), out=indptr[1:])
+    edges = len(sources)
+
+    return {
+        'node_ids': np.arange(n, dtype=np.int64),
+        'node_names': [f'Node {i}' for i in range(n)],
+        'node_types': ['city'] * n,
+        'node_lat': rows.astype(np.float64),
+        'node_lon': cols.astype(np.float64),
+        'indptr': indptr,
+        'indices': targets[order].astype(np.int32),
+        'edge_time': rng.uniform(1, 60, edges),
+        'edge_dist': rng.uniform(1, 50, edges),
+        'edge_cost': rng.uniform(1, 100, edges),
+        'edge_status': ['active'] * edges,
+        'edge_ids': np.arange(edges, dtype=np.int64),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Time point-to-point route searches against one full single-source '
+        'Dijkstra on synthetic grid networks (no database needed)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sides', type=int, nargs='+', default=[100, 300],
+                            help='Grid side lengths; each network has side^2 locations')
+        parser.add_argument('--pairs', type=int, default=50,
+                            help='Random source/destination pairs per network')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+
+        for side in options['sides']:
+            state = GraphState(grid_arrays(side, rng), version=0)
+            pairs = rng.integers(state.node_count, size=(options['pairs'], 2)).tolist()
+
+            # Compile (or load) any JIT kernels outside the timings
+            state._dijkstra('time', 0)
+            state._point_to_point_search('time', 0, state.node_count - 1)
+
+            started = time.perf_counter()
+            for src, _ in pairs:
+                state._dijkstra('time', src)
+            full = (time.perf_counter() - started) / len(pairs)
+
+            started = time.perf_counter()
+            for src, dst in pairs:
+                state._point_to_point_search('time', src, dst)
+            point = (time.perf_counter() - started) / len(pairs)
+
+            self.stdout.write(
+                f'{state.node_count:>7} nodes  full search {full * 1000:7.2f} ms  '
+                f'point-to-point {point * 1000:7.2f} ms  ({full / point:.1f}x)'
+            )
@@ -0,0 +1,23 @@
+# Generated by Django 5.0 on 2026-10-14 12:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logistics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='locationnode',
+            name='latitude',
+            field=models.FloatField(help_text='Latitude coordinate'),
+        ),
+        migrations.AlterField(
+            model_name='locationnode',
+            name='longitude',
+            field=models.FloatField(help_text='Longitude coordinate'),
+        ),
+    ]
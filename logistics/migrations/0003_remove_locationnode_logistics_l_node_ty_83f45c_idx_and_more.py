@@ -0,0 +1,21 @@
+# Generated by Django 5.0 on 2026-10-14 13:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logistics', '0002_alter_locationnode_latitude_and_more'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='locationnode',
+            name='logistics_l_node_ty_83f45c_idx',
+        ),
+        migrations.AddIndex(
+            model_name='locationnode',
+            index=models.Index(fields=['node_type', 'is_active'], name='logistics_l_node_ty_569aca_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-14 13:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logistics', '0003_remove_locationnode_logistics_l_node_ty_83f45c_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='package',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
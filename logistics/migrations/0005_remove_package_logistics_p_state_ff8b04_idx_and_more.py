@@ -0,0 +1,21 @@
+# Generated by Django 5.0 on 2026-10-14 13:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logistics', '0004_alter_package_created_at'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='package',
+            name='logistics_p_state_ff8b04_idx',
+        ),
+        migrations.AddIndex(
+            model_name='package',
+            index=models.Index(fields=['state', '-created_at'], name='logistics_p_state_335a36_idx'),
+        ),
+    ]
@@ -16,16 +16,12 @@ class LocationNode(models.Model):
     name = models.CharField(max_length=100)
     node_type = models.CharField(max_length=20, choices=NODE_TYPES)
     
-    # For now, we'll use simple decimal fields for coordinates
-    # We'll upgrade to PostGIS in Phase 2
-    latitude = models.DecimalField(
-        max_digits=9, 
-        decimal_places=6,
+    # For now, we'll use simple float fields for coordinates
+    # We'll upgrade to PostGIS (PointField) in Phase 2
+    latitude = models.FloatField(
         help_text="Latitude coordinate"
     )
-    longitude = models.DecimalField(
-        max_digits=9, 
-        decimal_places=6,
+    longitude = models.FloatField(
         help_text="Longitude coordinate"
     )
     
@@ -36,7 +32,8 @@ class LocationNode(models.Model):
     
     class Meta:
         indexes = [
-            models.Index(fields=['node_type']),
+            # Also serves node_type-only lookups
+            models.Index(fields=['node_type', 'is_active']),
             models.Index(fields=['is_active']),
         ]
         ordering = ['name']
@@ -149,14 +146,15 @@ class Package(models.Model):
     )
     
     # Timestamps
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
     delivered_at = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         indexes = [
             models.Index(fields=['tracking_id']),
-            models.Index(fields=['state']),
+            # Filter by state, newest first; also serves state-only lookups
+            models.Index(fields=['state', '-created_at']),
             models.Index(fields=['current_location']),
         ]
         ordering = ['-created_at']
@@ -0,0 +1,12 @@
+from rest_framework.pagination import CursorPagination
+
+
+class PackageCursorPagination(CursorPagination):
+    """
+    Keyset pagination for packages, newest first.
+    
+    Each page is a `created_at < cursor` range scan on the created_at
+    index, so deep pages cost the same as the first one.
+    """
+    page_size = 50
+    ordering = '-created_at'
@@ -1,7 +1,18 @@
+import serpy
 from rest_framework import serializers
 from .models import LocationNode, RouteEdge, Package
 
 
+def _format_datetime(value):
+    """Render a datetime the same way DRF's DateTimeField does."""
+    if value is None:
+        return None
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
 class LocationNodeSerializer(serializers.ModelSerializer):
     """Serializer for LocationNode model"""
     
@@ -19,8 +30,8 @@ class LocationNodeSerializer(serializers.ModelSerializer):
     
     def get_coordinates(self, obj):
         return {
-            'latitude': float(obj.latitude),
-            'longitude': float(obj.longitude)
+            'latitude': obj.latitude,
+            'longitude': obj.longitude
         }
 
 
@@ -81,4 +92,148 @@ class PackageStateTransitionSerializer(serializers.Serializer):
         choices=['start_transit', 'move_to_location', 'start_delivery', 'complete_delivery', 'cancel'],
         required=True
     )
-    new_location_id = serializers.IntegerField(required=False, allow_null=True)
\ No newline at end of file
+    new_location_id = serializers.IntegerField(required=False, allow_null=True)
+
+
+# Read-only serializers for list/retrieve endpoints.
+# These mirror the ModelSerializers above but skip DRF's per-instance field
+# discovery; the ModelSerializers are still used wherever input is validated.
+
+class LocationNodeReadSerializer(serpy.Serializer):
+    """Fast read-only serializer for LocationNode"""
+    
+    id = serpy.IntField()
+    name = serpy.StrField()
+    node_type = serpy.StrField()
+    node_type_display = serpy.StrField(attr='get_node_type_display', call=True)
+    latitude = serpy.FloatField()
+    longitude = serpy.FloatField()
+    coordinates = serpy.MethodField()
+    address = serpy.StrField()
+    is_active = serpy.BoolField()
+    created_at = serpy.MethodField()
+    updated_at = serpy.MethodField()
+    
+    def get_coordinates(self, obj):
+        return {
+            'latitude': obj.latitude,
+            'longitude': obj.longitude
+        }
+    
+    def get_created_at(self, obj):
+        return _format_datetime(obj.created_at)
+    
+    def get_updated_at(self, obj):
+        return _format_datetime(obj.updated_at)
+
+
+class RouteEdgeReadSerializer(serpy.Serializer):
+    """Fast read-only serializer for RouteEdge"""
+    
+    id = serpy.IntField()
+    source = serpy.IntField(attr='source_id')
+    source_name = serpy.StrField(attr='source.name')
+    destination = serpy.IntField(attr='destination_id')
+    destination_name = serpy.StrField(attr='destination.name')
+    distance_km = serpy.FloatField()
+    travel_time_minutes = serpy.IntField()
+    cost_per_km = serpy.StrField()
+    status = serpy.StrField()
+    status_display = serpy.StrField(attr='get_status_display', call=True)
+    created_at = serpy.MethodField()
+    updated_at = serpy.MethodField()
+    
+    def get_created_at(self, obj):
+        return _format_datetime(obj.created_at)
+    
+    def get_updated_at(self, obj):
+        return _format_datetime(obj.updated_at)
+
+
+class PackageReadSerializer(serpy.Serializer):
+    """Fast read-only serializer for Package"""
+    
+    id = serpy.IntField()
+    tracking_id = serpy.StrField()
+    state = serpy.StrField()
+    state_display = serpy.StrField(attr='get_state_display', call=True)
+    origin = serpy.IntField(attr='origin_id')
+    origin_name = serpy.StrField(attr='origin.name')
+    current_location = serpy.IntField(attr='current_location_id')
+    current_location_name = serpy.StrField(attr='current_location.name')
+    destination = serpy.IntField(attr='destination_id')
+    destination_name = serpy.StrField(attr='destination.name')
+    weight_kg = serpy.FloatField()
+    description = serpy.StrField()
+    created_at = serpy.MethodField()
+    updated_at = serpy.MethodField()
+    delivered_at = serpy.MethodField()
+    
+    def get_created_at(self, obj):
+        return _format_datetime(obj.created_at)
+    
+    def get_updated_at(self, obj):
+        return _format_datetime(obj.updated_at)
+    
+    def get_delivered_at(self, obj):
+        return _format_datetime(obj.delivered_at)
+
+
+# List endpoints build the read serializers' output straight from values()
+# rows, skipping model instantiation; keep these in step with the classes above.
+
+NODE_TYPE_LABELS = dict(LocationNode.NODE_TYPES)
+ROUTE_STATUS_LABELS = dict(RouteEdge.STATUS_CHOICES)
+
+
+def serialize_location_rows(queryset):
+    """Same output as LocationNodeReadSerializer(queryset, many=True)"""
+    rows = queryset.values(
+        'id', 'name', 'node_type', 'latitude', 'longitude',
+        'address', 'is_active', 'created_at', 'updated_at'
+    )
+    return [
+        {
+            'id': row['id'],
+            'name': row['name'],
+            'node_type': row['node_type'],
+            'node_type_display': NODE_TYPE_LABELS.get(row['node_type'], row['node_type']),
+            'latitude': row['latitude'],
+            'longitude': row['longitude'],
+            'coordinates': {
+                'latitude': row['latitude'],
+                'longitude': row['longitude']
+            },
+            'address': row['address'],
+            'is_active': row['is_active'],
+            'created_at': _format_datetime(row['created_at']),
+            'updated_at': _format_datetime(row['updated_at']),
+        }
+        for row in rows
+    ]
+
+
+def serialize_route_edge_rows(queryset):
+    """Same output as RouteEdgeReadSerializer(queryset, many=True)"""
+    rows = queryset.values(
+        'id', 'source_id', 'source__name', 'destination_id', 'destination__name',
+        'distance_km', 'travel_time_minutes', 'cost_per_km', 'status',
+        'created_at', 'updated_at'
+    )
+    return [
+        {
+            'id': row['id'],
+            'source': row['source_id'],
+            'source_name': row['source__name'],
+            'destination': row['destination_id'],
+            'destination_name': row['destination__name'],
+            'distance_km': float(row['distance_km']),
+            'travel_time_minutes': int(row['travel_time_minutes']),
+            'cost_per_km': str(row['cost_per_km']),
+            'status': row['status'],
+            'status_display': ROUTE_STATUS_LABELS.get(row['status'], row['status']),
+            'created_at': _format_datetime(row['created_at']),
+            'updated_at': _format_datetime(row['updated_at']),
+        }
+        for row in rows
+    ]
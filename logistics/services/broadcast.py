@@ -0,0 +1,231 @@
+import asyncio
+import datetime
+from typing import Dict, List, Tuple
+
+import msgpack
+import orjson
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+
+
+ROUTE_UPDATES_GROUP = 'route_updates'
+
+# Last state sent to the route_updates group, one cache key per item, so
+# producers only publish what actually changed
+ROUTE_STATE_EDGE_KEY = 'route_state_edge_{edge_id}'
+ROUTE_STATE_PACKAGE_KEY = 'route_state_package_{tracking_id}'
+ROUTE_STATE_TIMEOUT = 60 * 60 * 24
+
+# Package states drawn on the route visualization
+ROUTE_VISIBLE_STATES = ('in_transit', 'out_for_delivery')
+
+
+def _msgpack_default(obj):
+    """Encode types msgpack has no native representation for."""
+    if isinstance(obj, datetime.datetime):
+        return obj.isoformat()
+    raise TypeError(f'Cannot serialize {type(obj).__name__}')
+
+
+def pack_message(message: Dict) -> bytes:
+    """Encode a message as a MessagePack binary frame."""
+    return msgpack.packb(message, use_bin_type=True, default=_msgpack_default)
+
+
+def encode_frames(message: Dict) -> Dict:
+    """
+    Serialize a message once in every wire format the consumers speak.
+    
+    Returns:
+        Dictionary with the JSON text frame and the MessagePack binary frame
+    """
+    return {
+        'json': orjson.dumps(message).decode(),
+        'msgpack': pack_message(message),
+    }
+
+
+def _group_send_encoded(group: str, event_type: str, message: Dict) -> None:
+    channel_layer = get_channel_layer()
+    async_to_sync(channel_layer.group_send)(group, {
+        'type': event_type,
+        **encode_frames(message),
+    })
+
+
+def _broadcast_route_delta(data) -> None:
+    """Push a route_delta, encoded once, to every visualization subscriber."""
+    _group_send_encoded(ROUTE_UPDATES_GROUP, 'route_update_raw', {
+        'type': 'route_delta',
+        'data': data,
+    })
+
+
+def build_route_snapshot() -> Dict:
+    """
+    Full route visualization state, sent once when a client connects.
+    
+    Returns:
+        Dictionary with every edge status and every moving package position
+    """
+    from logistics.models import Package, RouteEdge
+    
+    edges = RouteEdge.objects.order_by().values_list('id', 'status')
+    packages = Package.objects.filter(
+        state__in=ROUTE_VISIBLE_STATES
+    ).order_by().values_list(
+        'tracking_id', 'current_location__latitude', 'current_location__longitude'
+    )
+    
+    return {
+        'edges': [
+            {'edge_id': edge_id, 'status': status}
+            for edge_id, status in edges
+        ],
+        'packages': [
+            {'tracking_id': tracking_id, 'lat': lat, 'lon': lon}
+            for tracking_id, lat, lon in packages
+        ],
+    }
+
+
+def publish_edge_status(edge_id: int, status: str) -> bool:
+    """
+    Send a route_delta for an edge whose status changed since last publish.
+    
+    Returns:
+        True if a delta was sent
+    """
+    key = ROUTE_STATE_EDGE_KEY.format(edge_id=edge_id)
+    if cache.get(key) == status:
+        return False
+    
+    cache.set(key, status, ROUTE_STATE_TIMEOUT)
+    _broadcast_route_delta({'edge_id': edge_id, 'status': status})
+    return True
+
+
+def publish_edge_removed(edge_id: int) -> None:
+    """Send a route_delta dropping a deleted edge (status None)."""
+    cache.delete(ROUTE_STATE_EDGE_KEY.format(edge_id=edge_id))
+    _broadcast_route_delta({'edge_id': edge_id, 'status': None})
+
+
+def publish_package_position(tracking_id: str, lat: float, lon: float) -> bool:
+    """
+    Send a route_delta for a package that moved since last publish.
+    
+    Returns:
+        True if a delta was sent
+    """
+    key = ROUTE_STATE_PACKAGE_KEY.format(tracking_id=tracking_id)
+    if cache.get(key) == (lat, lon):
+        return False
+    
+    cache.set(key, (lat, lon), ROUTE_STATE_TIMEOUT)
+    _broadcast_route_delta({'tracking_id': tracking_id, 'lat': lat, 'lon': lon})
+    return True
+
+
+def publish_package_removed(tracking_id: str) -> None:
+    """Send a route_delta dropping a package that is no longer on the move."""
+    cache.delete(ROUTE_STATE_PACKAGE_KEY.format(tracking_id=tracking_id))
+    _broadcast_route_delta({'tracking_id': tracking_id, 'removed': True})
+
+
+def publish_package_positions(positions: List[Tuple[str, float, float]]) -> int:
+    """
+    Batch form of publish_package_position for bulk moves.
+    
+    The last-sent state is read and written with one cache round-trip
+    each, and every changed position goes out in a single route_delta
+    whose data is a list.
+    
+    Args:
+        positions: (tracking_id, lat, lon) tuples
+    
+    Returns:
+        Number of positions that changed and were sent
+    """
+    keys = {
+        ROUTE_STATE_PACKAGE_KEY.format(tracking_id=tracking_id): (tracking_id, lat, lon)
+        for tracking_id, lat, lon in positions
+    }
+    last_sent = cache.get_many(list(keys))
+    changed = {
+        key: position for key, position in keys.items()
+        if last_sent.get(key) != position[1:]
+    }
+    if not changed:
+        return 0
+    
+    cache.set_many(
+        {key: position[1:] for key, position in changed.items()},
+        ROUTE_STATE_TIMEOUT
+    )
+    _broadcast_route_delta([
+        {'tracking_id': tracking_id, 'lat': lat, 'lon': lon}
+        for tracking_id, lat, lon in changed.values()
+    ])
+    return len(changed)
+
+
+def broadcast_package_update(tracking_id: str, data: Dict) -> None:
+    """Push a package update to everyone tracking this package."""
+    _group_send_encoded(f'package_{tracking_id}', 'package_update_raw', {
+        'type': 'package_update',
+        'data': data,
+    })
+
+
+def broadcast_package_updates(updates: Dict[str, Dict]) -> None:
+    """
+    Push many package updates in one event loop round-trip.
+    
+    Each package has its own group, so the sends can't be merged into one
+    message; they are issued concurrently instead of one blocking
+    async_to_sync call per package.
+    
+    Args:
+        updates: Mapping of tracking_id -> update data
+    """
+    if not updates:
+        return
+    
+    channel_layer = get_channel_layer()
+    
+    async def send_all():
+        await asyncio.gather(*(
+            channel_layer.group_send(f'package_{tracking_id}', {
+                'type': 'package_update_raw',
+                **encode_frames({'type': 'package_update', 'data': data}),
+            })
+            for tracking_id, data in updates.items()
+        ))
+    
+    async_to_sync(send_all)()
+
+
+def broadcast_task_complete(task_id: str, result: Dict) -> None:
+    """Push a finished task's result to the clients waiting on it."""
+    _group_send_encoded(f'task_{task_id}', 'task_complete_raw', {
+        'type': 'task_complete',
+        'data': {
+            'task_id': task_id,
+            'state': 'SUCCESS',
+            'result': result,
+        },
+    })
+
+
+def broadcast_task_failed(task_id: str, error: Exception) -> None:
+    """Tell the clients waiting on a task that it raised."""
+    _group_send_encoded(f'task_{task_id}', 'task_complete_raw', {
+        'type': 'task_complete',
+        'data': {
+            'task_id': task_id,
+            'state': 'FAILURE',
+            'error': str(error),
+        },
+    })
@@ -1,182 +1,437 @@
-import networkx as nx
+import copy
+import logging
+import os
+import threading
+import time
+from functools import lru_cache
+
+import numpy as np
 from typing import Dict, List, Optional, Tuple
+
+try:
+    from scipy.sparse import csr_matrix, csgraph
+except ImportError:  # pragma: no cover - exercised only without SciPy
+    # Same search, compiled from logistics.services.jit_dijkstra instead
+    csr_matrix = csgraph = None
+
+try:
+    # Point-to-point searches, and every search when SciPy is missing
+    from logistics.services import jit_dijkstra
+except ImportError:  # pragma: no cover - Numba is optional alongside SciPy
+    if csgraph is None:
+        raise
+    jit_dijkstra = None
+from django.conf import settings
+from django.core.cache import cache
 from logistics.models import LocationNode, RouteEdge
 
+logger = logging.getLogger(__name__)
 
-class RouteCalculator:
+
+# Shared cache keys: the version counter is bumped whenever locations or
+# routes change, and each version's graph arrays are stored under their own key
+GRAPH_VERSION_KEY = 'graph_version'
+GRAPH_BLOB_KEY = 'graph_blob_v{version}'
+GRAPH_APSP_KEY = 'graph_apsp_v{version}'
+GRAPH_BLOB_TIMEOUT = 60 * 60 * 24
+
+# Small marker written once a version's all-pairs matrices are stored, so
+# processes that built the graph before the worker finished can poll for
+# them without fetching the matrices themselves
+GRAPH_APSP_READY_KEY = 'graph_apsp_ready_v{version}'
+APSP_RECHECK_INTERVAL = 10
+
+# Older versions whose keys are deleted once a new version is stored
+STALE_VERSIONS_SWEPT = 50
+
+# Rows fetched per database round-trip while loading the graph
+LOAD_CHUNK_SIZE = 2000
+
+# Route results memoized per graph version
+ROUTE_CACHE_SIZE = 1024
+
+# Reachability searches memoized per graph version, as compact row/time
+# arrays (about 12 bytes per reachable location) rather than response dicts
+REACHABLE_CACHE_SIZE = 256
+
+# Route results shared across processes; the graph version in the key
+# means entries go stale by themselves once the network changes
+ROUTE_RESULT_KEY = 'route:{source_id}:{destination_id}:{optimize_by}:{graph_version}'
+ROUTE_RESULT_TIMEOUT = 300
+
+
+def get_graph_version() -> int:
+    """Return the current network version, initialising it if missing."""
+    version = cache.get(GRAPH_VERSION_KEY)
+    if version is None:
+        cache.add(GRAPH_VERSION_KEY, 1, timeout=None)
+        version = cache.get(GRAPH_VERSION_KEY, 1)
+    return version
+
+
+def forget_versions_before(version: int) -> None:
+    """Delete the cached graphs of versions superseded by this one."""
+    stale = range(max(1, version - STALE_VERSIONS_SWEPT), version)
+    cache.delete_many([
+        key.format(version=old)
+        for old in stale
+        for key in (GRAPH_BLOB_KEY, GRAPH_APSP_KEY, GRAPH_APSP_READY_KEY)
+    ])
+
+
+def bump_graph_version() -> int:
+    """Invalidate every cached graph by moving to a new version."""
+    try:
+        return cache.incr(GRAPH_VERSION_KEY)
+    except ValueError:
+        cache.add(GRAPH_VERSION_KEY, 1, timeout=None)
+        return cache.incr(GRAPH_VERSION_KEY)
+
+
+def _empty_arrays() -> Dict:
+    """Graph arrays for a network with no locations."""
+    return {
+        'node_ids': np.empty(0, dtype=np.int64),
+        'node_names': [],
+        'node_types': [],
+        'node_lat': np.empty(0, dtype=np.float64),
+        'node_lon': np.empty(0, dtype=np.float64),
+        'indptr': np.zeros(1, dtype=np.int32),
+        'indices': np.empty(0, dtype=np.int32),
+        'edge_time': np.empty(0, dtype=np.float64),
+        'edge_dist': np.empty(0, dtype=np.float64),
+        'edge_cost': np.empty(0, dtype=np.float64),
+        'edge_status': [],
+        'edge_ids': np.empty(0, dtype=np.int64),
+    }
+
+
+class GraphState:
     """
-    Handles graph-based route calculations using Dijkstra's algorithm.
-    This is the core algorithmic engine of LogiRoute.
+    One version of the network as CSR arrays, plus the searches over it.
+
+    A state is never modified once built: a rebuild produces a new one and
+    the calculator swaps it in, so a query keeps reading a consistent set
+    of arrays without holding a lock. Results are memoized on the state
+    and are dropped along with it.
     """
-    
-    def __init__(self):
-        self.graph: Optional[nx.DiGraph] = None
-        self.node_data: Dict = {}
-    
-    def build_graph(self, force_rebuild: bool = False) -> nx.DiGraph:
+
+    def __init__(
+        self,
+        arrays: Optional[Dict] = None,
+        version: Optional[int] = None,
+        apsp_pred: Optional[Dict[str, np.ndarray]] = None
+    ):
         """
-        Construct in-memory graph from database.
-        
         Args:
-            force_rebuild: If True, rebuild even if graph exists
-            
+            arrays: Graph arrays produced by RouteCalculator._load_from_db
+                (an empty network if omitted)
+            version: Network version the arrays were loaded for (None if
+                the shared cache was unavailable)
+            apsp_pred: All-pairs predecessor matrices per metric, if solved
+        """
+        # False for the placeholder a calculator starts from or is reset to
+        self.loaded = arrays is not None
+        arrays = arrays or _empty_arrays()
+        self.version = version
+
+        # node_id -> CSR row index, and the reverse mapping
+        self.node_ids: np.ndarray = arrays['node_ids']
+        self.node_index: Dict[int, int] = {int(node_id): row for row, node_id in enumerate(self.node_ids)}
+
+        # Node attributes as parallel arrays indexed by CSR row
+        self.node_names: List[str] = arrays['node_names']
+        self.node_types: List[str] = arrays['node_types']
+        self.node_lat: np.ndarray = arrays['node_lat']
+        self.node_lon: np.ndarray = arrays['node_lon']
+
+        # CSR structure shared by every metric
+        self.indptr: np.ndarray = arrays['indptr']
+        self.indices: np.ndarray = arrays['indices']
+
+        # Edge attributes as parallel arrays indexed by CSR offset (edge index)
+        self.edge_time: np.ndarray = arrays['edge_time']
+        self.edge_dist: np.ndarray = arrays['edge_dist']
+        self.edge_cost: np.ndarray = arrays['edge_cost']
+        self.edge_status: List[str] = arrays['edge_status']
+        self.edge_ids: np.ndarray = arrays['edge_ids']
+
+        self.edge_sources: np.ndarray = np.repeat(
+            np.arange(len(self.indptr) - 1, dtype=np.int32), np.diff(self.indptr)
+        )
+
+        # (source row, destination row) -> edge index
+        self.edge_lookup: Dict[Tuple[int, int], int] = {
+            uv: edge_idx
+            for edge_idx, uv in enumerate(zip(self.edge_sources.tolist(), self.indices.tolist()))
+        }
+
+        # Transposed CSR structure for searching backwards to a destination
+        n = len(self.node_ids)
+        self.rev_order: np.ndarray = np.argsort(self.indices, kind='stable')
+        self.rev_indices: np.ndarray = self.edge_sources[self.rev_order]
+        self.rev_indptr: np.ndarray = np.concatenate((
+            [0], np.cumsum(np.bincount(self.indices, minlength=n))
+        )).astype(np.int32)
+
+        # One weight array per optimization metric, all sharing indptr/indices
+        self.weights: Dict[str, np.ndarray] = {
+            'time': self.edge_time,
+            'distance': self.edge_dist,
+            'cost': self.edge_cost,
+        }
+        self.reverse_weights: Dict[str, np.ndarray] = {
+            metric: data[self.rev_order] for metric, data in self.weights.items()
+        }
+
+        if csr_matrix is None:
+            self.matrices: Dict[str, 'csr_matrix'] = {}
+        else:
+            self.matrices = {
+                metric: csr_matrix((data, self.indices, self.indptr), shape=(n, n))
+                for metric, data in self.weights.items()
+            }
+
+        # All-pairs predecessor matrices per metric (small networks only)
+        self.apsp_pred: Dict[str, np.ndarray] = apsp_pred or {}
+
+        self._init_memo()
+
+    def _init_memo(self) -> None:
+        # Results are shared between callers and must be treated as read-only
+        self.shortest_path = lru_cache(maxsize=ROUTE_CACHE_SIZE)(self._cached_shortest_path)
+        self.reachable_rows = lru_cache(maxsize=REACHABLE_CACHE_SIZE)(self._reachable_rows)
+
+    @property
+    def node_count(self) -> int:
+        return len(self.node_ids)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.indices)
+
+    @property
+    def graph(self) -> Optional['csr_matrix']:
+        """CSR adjacency matrix weighted by travel time (None without SciPy)."""
+        return self.matrices.get('time')
+
+    def with_all_pairs(self, apsp_pred: Dict[str, np.ndarray]) -> 'GraphState':
+        """
+        Copy of this state that answers queries from the given matrices.
+
+        The arrays are shared with this state rather than rebuilt.
+        """
+        state = copy.copy(self)
+        state.apsp_pred = apsp_pred
+        state._init_memo()
+        return state
+
+    def all_pairs_predecessors(self) -> Dict[str, np.ndarray]:
+        """
+        Solve every shortest path of this graph up front.
+
+        One multi-source Dijkstra per metric yields a predecessor matrix, so
+        later queries only walk a row of it.
+        """
+        apsp_pred = {}
+        for metric in self.weights:
+            if csgraph is not None:
+                _, pred = csgraph.dijkstra(self.matrices[metric], return_predecessors=True)
+            else:
+                pred = np.stack([
+                    self._dijkstra(metric, row)[1] for row in range(self.node_count)
+                ])
+            apsp_pred[metric] = pred.astype(np.int32, copy=False)
+        return apsp_pred
+
+    def _dijkstra(self, metric: str, row: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Single-source Dijkstra from a CSR row, with SciPy or the JIT fallback.
+
         Returns:
-            NetworkX directed graph
-        """
-        if self.graph is not None and not force_rebuild:
-            return self.graph
-        
-        G = nx.DiGraph()
-        
-        # Add nodes with metadata
-        nodes = LocationNode.objects.filter(is_active=True)
-        for node in nodes:
-            G.add_node(
-                node.id,
-                name=node.name,
-                node_type=node.node_type,
-                latitude=float(node.latitude),
-                longitude=float(node.longitude),
-                address=node.address
-            )
-            
-            # Store for quick lookup
-            self.node_data[node.id] = {
-                'name': node.name,
-                'type': node.node_type,
-                'coords': (float(node.latitude), float(node.longitude))
+            (dist, pred) arrays indexed by CSR row
+        """
+        if csgraph is not None:
+            return csgraph.dijkstra(self.matrices[metric], indices=row, return_predecessors=True)
+
+        return jit_dijkstra.dijkstra(
+            self.indptr, self.indices, self.weights[metric], row, self.node_count, np.inf
+        )
+
+    def _node_summary(self, row: int) -> Dict:
+        return {
+            'id': int(self.node_ids[row]),
+            'name': self.node_names[row],
+            'coordinates': {
+                'latitude': float(self.node_lat[row]),
+                'longitude': float(self.node_lon[row])
             }
-        
-        # Add edges with weights
-        edges = RouteEdge.objects.select_related('source', 'destination')
-        
-        for edge in edges:
-            # Calculate weight based on status
-            base_weight = edge.travel_time_minutes
-            
-            if edge.status == 'closed':
-                # Don't add closed routes to graph
-                continue
-            elif edge.status == 'slow':
-                # Apply 50% penalty for slow routes
-                weight = base_weight * 1.5
-            else:  # active
-                weight = base_weight
-            
-            G.add_edge(
-                edge.source_id,
-                edge.destination_id,
-                weight=weight,
-                distance=float(edge.distance_km),
-                cost=float(edge.cost_per_km) * edge.distance_km,
-                status=edge.status,
-                edge_id=edge.id
-            )
-        
-        self.graph = G
-        return G
-    
-    def calculate_shortest_path(
+        }
+
+    def _path_from_predecessors(self, pred_row: np.ndarray, src_row: int, dst_row: int) -> Optional[List[int]]:
+        """
+        Walk a predecessor row back from the destination to the source.
+
+        Returns:
+            CSR row indices along the path, or None if unreachable
+        """
+        if src_row != dst_row and pred_row[dst_row] < 0:
+            return None
+
+        rows = [dst_row]
+        while rows[-1] != src_row:
+            rows.append(int(pred_row[rows[-1]]))
+        rows.reverse()
+        return rows
+
+    def _point_to_point_search(self, metric: str, src_row: int, dst_row: int) -> Optional[List[int]]:
+        """
+        Shortest path between two rows.
+
+        With Numba this is a bidirectional Dijkstra that stops once the two
+        frontiers meet, so it settles roughly the nodes within half the
+        route's length of either end. SciPy has no early exit at a target,
+        so without Numba it is one full forward search; bounded searches
+        that restart with a growing radius were measured slower than that.
+
+        Returns:
+            CSR row indices along the path, or None if unreachable
+        """
+        if src_row == dst_row:
+            return [src_row]
+
+        if jit_dijkstra is None:
+            _, pred = self._dijkstra(metric, src_row)
+            return self._path_from_predecessors(pred, src_row, dst_row)
+
+        _, meet, pred_f, pred_b = jit_dijkstra.bidirectional_dijkstra(
+            self.indptr, self.indices, self.weights[metric],
+            self.rev_indptr, self.rev_indices, self.reverse_weights[metric],
+            src_row, dst_row, self.node_count
+        )
+        if meet < 0:
+            return None
+
+        rows = [int(meet)]
+        while rows[-1] != src_row:
+            rows.append(int(pred_f[rows[-1]]))
+        rows.reverse()
+
+        while rows[-1] != dst_row:
+            rows.append(int(pred_b[rows[-1]]))
+
+        return rows
+
+    def _cached_shortest_path(
         self,
         source_id: int,
         destination_id: int,
-        optimize_by: str = 'time'
+        optimize_by: str
     ) -> Dict:
         """
-        Calculate the shortest path using Dijkstra's algorithm.
-        
-        Args:
-            source_id: Starting location node ID
-            destination_id: Ending location node ID
-            optimize_by: 'time', 'distance', or 'cost'
-            
-        Returns:
-            Dictionary with path details or error
+        Route from the shared cache, computing and storing it on a miss.
+
+        Sits behind the per-process LRU, so a route solved by any worker
+        is a single cache read for the others. A state built while the
+        cache was down has no version to key on and skips it.
+        """
+        if self.version is None:
+            return self._shortest_path(source_id, destination_id, optimize_by)
+
+        key = ROUTE_RESULT_KEY.format(
+            source_id=source_id,
+            destination_id=destination_id,
+            optimize_by=optimize_by,
+            graph_version=self.version
+        )
+        return cache.get_or_set(
+            key,
+            lambda: self._shortest_path(source_id, destination_id, optimize_by),
+            ROUTE_RESULT_TIMEOUT
+        )
+
+    def _shortest_path(
+        self,
+        source_id: int,
+        destination_id: int,
+        optimize_by: str
+    ) -> Dict:
+        """
+        Uncached route calculation.
         """
-        # Build graph if not exists
-        if self.graph is None:
-            self.build_graph()
-        
         # Validate nodes exist in graph
-        if source_id not in self.graph:
+        if source_id not in self.node_index:
             return {
                 'status': 'error',
                 'error': f'Source location (ID: {source_id}) not found or inactive'
             }
-        
-        if destination_id not in self.graph:
+
+        if destination_id not in self.node_index:
             return {
                 'status': 'error',
                 'error': f'Destination location (ID: {destination_id}) not found or inactive'
             }
-        
-        # Select weight attribute based on optimization preference
-        weight_attr = {
-            'time': 'weight',
-            'distance': 'distance',
-            'cost': 'cost'
-        }.get(optimize_by, 'weight')
-        
+
+        # Select weight metric based on optimization preference
+        metric = optimize_by if optimize_by in self.weights else 'time'
+        src_row = self.node_index[source_id]
+        dst_row = self.node_index[destination_id]
+
         try:
-            # Run Dijkstra's algorithm
-            path = nx.dijkstra_path(
-                self.graph,
-                source_id,
-                destination_id,
-                weight=weight_attr
+            apsp_pred = self.apsp_pred.get(metric)
+            if apsp_pred is not None:
+                # Precomputed: just read the path out of the matrix
+                rows = self._path_from_predecessors(apsp_pred[src_row], src_row, dst_row)
+            else:
+                rows = self._point_to_point_search(metric, src_row, dst_row)
+
+            if rows is None:
+                return {
+                    'status': 'error',
+                    'error': 'No route available between these locations'
+                }
+
+            # Calculate path metrics with one vectorized pass per attribute
+            edge_idx = np.array(
+                [self.edge_lookup[hop] for hop in zip(rows[:-1], rows[1:])],
+                dtype=np.int64
             )
-            
-            # Calculate path metrics
-            total_time = 0
-            total_distance = 0
-            total_cost = 0
-            route_segments = []
-            
-            for i in range(len(path) - 1):
-                current_node = path[i]
-                next_node = path[i + 1]
-                edge_data = self.graph[current_node][next_node]
-                
-                total_time += edge_data['weight']
-                total_distance += edge_data['distance']
-                total_cost += edge_data['cost']
-                
-                route_segments.append({
-                    'from': {
-                        'id': current_node,
-                        'name': self.node_data[current_node]['name'],
-                        'coordinates': {
-                            'latitude': self.node_data[current_node]['coords'][0],
-                            'longitude': self.node_data[current_node]['coords'][1]
-                        }
-                    },
-                    'to': {
-                        'id': next_node,
-                        'name': self.node_data[next_node]['name'],
-                        'coordinates': {
-                            'latitude': self.node_data[next_node]['coords'][0],
-                            'longitude': self.node_data[next_node]['coords'][1]
-                        }
-                    },
-                    'distance_km': round(edge_data['distance'], 2),
-                    'time_minutes': round(edge_data['weight'], 0),
-                    'cost': round(edge_data['cost'], 2),
-                    'status': edge_data['status']
-                })
-            
+            total_time = float(self.edge_time[edge_idx].sum())
+            total_distance = float(self.edge_dist[edge_idx].sum())
+            total_cost = float(self.edge_cost[edge_idx].sum())
+
+            route_segments = [
+                {
+                    'from': self._node_summary(current_row),
+                    'to': self._node_summary(next_row),
+                    'distance_km': round(distance, 2),
+                    'time_minutes': round(time, 0),
+                    'cost': round(cost, 2),
+                    'status': self.edge_status[idx]
+                }
+                for current_row, next_row, idx, time, distance, cost in zip(
+                    rows[:-1],
+                    rows[1:],
+                    edge_idx.tolist(),
+                    self.edge_time[edge_idx].tolist(),
+                    self.edge_dist[edge_idx].tolist(),
+                    self.edge_cost[edge_idx].tolist()
+                )
+            ]
+
             # Build complete node list
             route_nodes = []
-            for node_id in path:
+            for row in rows:
                 route_nodes.append({
-                    'id': node_id,
-                    'name': self.node_data[node_id]['name'],
-                    'type': self.node_data[node_id]['type'],
+                    'id': int(self.node_ids[row]),
+                    'name': self.node_names[row],
+                    'type': self.node_types[row],
                     'coordinates': {
-                        'latitude': self.node_data[node_id]['coords'][0],
-                        'longitude': self.node_data[node_id]['coords'][1]
+                        'latitude': float(self.node_lat[row]),
+                        'longitude': float(self.node_lon[row])
                     }
                 })
-            
+
             return {
                 'status': 'success',
                 'route': {
@@ -186,65 +441,376 @@ class RouteCalculator:
                         'total_distance_km': round(total_distance, 2),
                         'total_time_minutes': round(total_time, 0),
                         'total_cost': round(total_cost, 2),
-                        'stops': len(path) - 2,  # Excluding origin and destination
+                        'stops': len(rows) - 2,  # Excluding origin and destination
                         'optimized_by': optimize_by
                     }
                 }
             }
-            
-        except nx.NetworkXNoPath:
-            return {
-                'status': 'error',
-                'error': 'No route available between these locations'
-            }
+
         except Exception as e:
             return {
                 'status': 'error',
                 'error': f'Route calculation failed: {str(e)}'
             }
-    
-    def get_all_routes_from_location(self, location_id: int) -> Dict:
+
+    def _reachable_rows(self, src_row: int) -> Tuple[np.ndarray, np.ndarray]:
         """
-        Get all possible routes from a given location.
-        
-        Args:
-            location_id: Starting location node ID
-            
+        Uncached reachability search.
+
         Returns:
-            Dictionary with all reachable destinations
+            Rows reachable from src_row (excluding itself) and their travel times
+        """
+        travel_times, _ = self._dijkstra('time', src_row)
+        rows = np.flatnonzero(np.isfinite(travel_times))
+        rows = rows[rows != src_row].astype(np.int32)
+        return rows, travel_times[rows]
+
+    def reachable_from(self, location_id: int) -> Dict:
         """
-        if self.graph is None:
-            self.build_graph()
-        
-        if location_id not in self.graph:
+        Every destination reachable from a location, with travel times.
+
+        The search is memoized; the response dictionary is built per call.
+        """
+        if location_id not in self.node_index:
             return {
                 'status': 'error',
                 'error': 'Location not found'
             }
-        
-        # Get all nodes reachable from this location
-        reachable = nx.single_source_shortest_path_length(
-            self.graph,
-            location_id,
-            weight='weight'
-        )
-        
-        destinations = []
-        for dest_id, travel_time in reachable.items():
-            if dest_id != location_id:  # Exclude source itself
-                destinations.append({
-                    'id': dest_id,
-                    'name': self.node_data[dest_id]['name'],
-                    'type': self.node_data[dest_id]['type'],
-                    'estimated_time_minutes': round(travel_time, 0)
-                })
-        
+
+        src_row = self.node_index[location_id]
+        rows, travel_times = self.reachable_rows(src_row)
+
+        destinations = [
+            {
+                'id': int(self.node_ids[row]),
+                'name': self.node_names[row],
+                'type': self.node_types[row],
+                'estimated_time_minutes': round(travel_time, 0)
+            }
+            for row, travel_time in zip(rows.tolist(), travel_times.tolist())
+        ]
+
         return {
             'status': 'success',
             'source': {
                 'id': location_id,
-                'name': self.node_data[location_id]['name']
+                'name': self.node_names[src_row]
             },
             'reachable_destinations': destinations,
             'count': len(destinations)
-        }
\ No newline at end of file
+        }
+
+
+class RouteCalculator:
+    """
+    Handles graph-based route calculations using Dijkstra's algorithm.
+    This is the core algorithmic engine of LogiRoute.
+
+    The network is held as a CSR adjacency structure (one row per active
+    node) so the shortest-path search runs inside scipy's compiled
+    Dijkstra instead of Python-level heap operations. Without SciPy the
+    same arrays are searched by a Numba-compiled Dijkstra.
+
+    Each version of the network is an immutable GraphState. Rebuilds are
+    serialized and swap the new state in; queries take whichever state is
+    current when they start and run without the lock.
+    """
+
+    def __init__(self):
+        self._state = GraphState()
+
+        # Serializes rebuilds; queries never take it
+        self._lock = threading.RLock()
+        if hasattr(os, 'register_at_fork'):  # POSIX only
+            os.register_at_fork(after_in_child=self._reset_lock)
+
+        # When this process last looked for the current version's matrices
+        self._apsp_checked_at = 0.0
+
+    def _reset_lock(self) -> None:
+        # A fork during a rebuild would leave the child's copy of the lock
+        # held by a thread that doesn't exist there
+        self._lock = threading.RLock()
+
+    @property
+    def state(self) -> GraphState:
+        return self._state
+
+    @property
+    def graph(self) -> Optional['csr_matrix']:
+        return self._state.graph
+
+    @property
+    def graph_version(self) -> Optional[int]:
+        return self._state.version
+
+    @property
+    def node_index(self) -> Dict[int, int]:
+        return self._state.node_index
+
+    @property
+    def node_count(self) -> int:
+        return self._state.node_count
+
+    @property
+    def edge_count(self) -> int:
+        return self._state.edge_count
+
+    def build_graph(self, force_rebuild: bool = False) -> Optional['csr_matrix']:
+        """
+        Construct in-memory graph, reusing the shared cached copy if possible.
+
+        The graph is only reloaded when the network version in the cache
+        has moved on since it was last built in this process.
+
+        Args:
+            force_rebuild: If True, rebuild from the database even if a
+                cached graph exists
+
+        Returns:
+            CSR adjacency matrix weighted by travel time (None without SciPy)
+        """
+        return self._current_state(force_rebuild).graph
+
+    def _current_state(self, force_rebuild: bool = False) -> GraphState:
+        """Return the state for the current network version, building it if needed."""
+        try:
+            version = get_graph_version()
+        except Exception:
+            # No shared cache to compare versions against; keep answering
+            # from this process's graph until it is reachable again
+            logger.warning('Graph version unavailable, using the in-process graph', exc_info=True)
+            return self._local_state()
+
+        state = self._state
+        if not force_rebuild and state.version == version:
+            return self._with_published_apsp(state)
+
+        with self._lock:
+            # Another thread may have rebuilt while we waited
+            state = self._state
+            if not force_rebuild and state.version == version:
+                return state
+
+            state = self._load_state(version, force_rebuild)
+            self._state = state
+            return state
+
+    def _local_state(self) -> GraphState:
+        """Current state, loaded straight from the database if there is none."""
+        state = self._state
+        if state.loaded:
+            return state
+
+        with self._lock:
+            state = self._state
+            if not state.loaded:
+                state = GraphState(self._load_from_db())
+                self._state = state
+            return state
+
+    def _load_state(self, version: int, force_rebuild: bool) -> GraphState:
+        """Load the given version's arrays into a new state; caller holds the lock."""
+        blob_key = GRAPH_BLOB_KEY.format(version=version)
+        arrays = None if force_rebuild else cache.get(blob_key)
+
+        if arrays is None:
+            arrays = self._load_from_db()
+            cache.set(blob_key, arrays, GRAPH_BLOB_TIMEOUT)
+            forget_versions_before(version)
+
+        self._apsp_checked_at = time.monotonic()
+        apsp_pred = None
+        if not force_rebuild and cache.get(GRAPH_APSP_READY_KEY.format(version=version)):
+            apsp_pred = cache.get(GRAPH_APSP_KEY.format(version=version))
+        return GraphState(arrays, version, apsp_pred)
+
+    def _with_published_apsp(self, state: GraphState) -> GraphState:
+        """
+        Attach the all-pairs matrices once the worker has stored them.
+
+        A process usually builds a new version before rebuild_graph_cache
+        has finished solving it, so while the state has no matrices the
+        ready marker is re-checked every APSP_RECHECK_INTERVAL seconds.
+        """
+        if state.apsp_pred or not 0 < state.node_count < settings.APSP_MAX_NODES:
+            return state
+
+        now = time.monotonic()
+        if now - self._apsp_checked_at < APSP_RECHECK_INTERVAL:
+            return state
+        self._apsp_checked_at = now
+
+        if not cache.get(GRAPH_APSP_READY_KEY.format(version=state.version)):
+            return state
+        apsp_pred = cache.get(GRAPH_APSP_KEY.format(version=state.version))
+        if not apsp_pred:
+            return state
+
+        with self._lock:
+            if self._state is state:
+                self._state = state.with_all_pairs(apsp_pred)
+            return self._state
+
+    def invalidate(self) -> None:
+        """
+        Drop this process's graph so the next query rebuilds it.
+        """
+        with self._lock:
+            self._state = GraphState()
+
+    def precompute_all_pairs(self) -> bool:
+        """
+        Solve every shortest path of the current graph up front.
+
+        Costs O(N^2) memory, so this is skipped for networks of
+        APSP_MAX_NODES or more. The matrices are computed without the lock
+        and only attached if no rebuild happened in the meantime.
+
+        Returns:
+            True if the matrices were computed and cached
+        """
+        state = self._current_state()
+
+        if state.node_count == 0 or state.node_count >= settings.APSP_MAX_NODES:
+            return False
+        if state.version is None:
+            # Nowhere to publish the matrices while the cache is down
+            return False
+
+        apsp_pred = state.all_pairs_predecessors()
+        cache.set(GRAPH_APSP_KEY.format(version=state.version), apsp_pred, GRAPH_BLOB_TIMEOUT)
+        cache.set(GRAPH_APSP_READY_KEY.format(version=state.version), True, GRAPH_BLOB_TIMEOUT)
+
+        with self._lock:
+            if self._state is state:
+                self._state = state.with_all_pairs(apsp_pred)
+        return True
+
+    def _load_from_db(self) -> Dict:
+        """
+        Read locations and routes from the database into compact CSR arrays.
+
+        Returns:
+            Dictionary of numpy arrays and node metadata, suitable for caching
+        """
+        node_ids = []
+        names = []
+        types = []
+        lats = []
+        lons = []
+
+        # Add nodes with metadata, reading plain tuples rather than models.
+        # Ordering by id keeps node_ids sorted for the searchsorted lookup below
+        nodes = LocationNode.objects.filter(is_active=True).order_by('id').values_list(
+            'id', 'name', 'node_type', 'latitude', 'longitude'
+        )
+        for node_id, name, node_type, latitude, longitude in nodes.iterator(chunk_size=LOAD_CHUNK_SIZE):
+            node_ids.append(node_id)
+            names.append(name)
+            types.append(node_type)
+            lats.append(latitude)
+            lons.append(longitude)
+
+        n = len(node_ids)
+        node_ids = np.asarray(node_ids, dtype=np.int64)
+
+        # Fetch edges column-wise; only FK ids are needed, and those live on
+        # the edge row itself
+        edges = RouteEdge.objects.order_by().values_list(
+            'id', 'source_id', 'destination_id', 'distance_km',
+            'travel_time_minutes', 'status', 'cost_per_km'
+        )
+        columns = list(zip(*edges.iterator(chunk_size=LOAD_CHUNK_SIZE))) or [()] * 7
+        edge_ids = np.asarray(columns[0], dtype=np.int64)
+        source_ids = np.asarray(columns[1], dtype=np.int64)
+        destination_ids = np.asarray(columns[2], dtype=np.int64)
+        distances = np.asarray(columns[3], dtype=np.float64)
+        travel_times = np.asarray(columns[4], dtype=np.float64)
+        statuses = np.asarray(columns[5], dtype=str)
+        costs_per_km = np.asarray(columns[6], dtype=np.float64)
+
+        sources, source_active = self._rows_for(node_ids, source_ids)
+        targets, target_active = self._rows_for(node_ids, destination_ids)
+
+        # Closed routes and routes touching inactive locations are not
+        # traversable; slow routes carry a 50% time penalty
+        mask = (statuses != 'closed') & source_active & target_active
+        weights = np.where(statuses == 'slow', travel_times * 1.5, travel_times)
+
+        # Sort kept edges by source row to lay them out in CSR order
+        sources = sources[mask].astype(np.int32)
+        order = np.argsort(sources, kind='stable')
+        keep = np.flatnonzero(mask)[order]
+
+        indptr = np.zeros(n + 1, dtype=np.int32)
+        np.cumsum(np.bincount(sources, minlength=n), out=indptr[1:])
+
+        return {
+            'node_ids': node_ids,
+            'node_names': names,
+            'node_types': types,
+            'node_lat': np.asarray(lats, dtype=np.float64),
+            'node_lon': np.asarray(lons, dtype=np.float64),
+            'indptr': indptr,
+            'indices': targets[keep].astype(np.int32),
+            'edge_time': weights[keep],
+            'edge_dist': distances[keep],
+            'edge_cost': (costs_per_km * distances)[keep],
+            'edge_status': statuses[keep].tolist(),
+            'edge_ids': edge_ids[keep],
+        }
+
+    @staticmethod
+    def _rows_for(node_ids: np.ndarray, ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Map location ids to CSR rows via the sorted node_ids array.
+
+        Returns:
+            Row index per id, and a mask of which ids are active nodes
+        """
+        rows = np.searchsorted(node_ids, ids)
+        found = rows < len(node_ids)
+        found[found] = node_ids[rows[found]] == ids[found]
+        return rows, found
+
+    def calculate_shortest_path(
+        self,
+        source_id: int,
+        destination_id: int,
+        optimize_by: str = 'time'
+    ) -> Dict:
+        """
+        Calculate the shortest path using Dijkstra's algorithm.
+
+        Args:
+            source_id: Starting location node ID
+            destination_id: Ending location node ID
+            optimize_by: 'time', 'distance', or 'cost'
+
+        Returns:
+            Dictionary with path details or error
+        """
+        # Build graph if not exists or the network has changed
+        state = self._current_state()
+        return state.shortest_path(source_id, destination_id, optimize_by)
+
+    def get_all_routes_from_location(self, location_id: int) -> Dict:
+        """
+        Get all possible routes from a given location.
+
+        The search is memoized per graph version like
+        calculate_shortest_path.
+
+        Args:
+            location_id: Starting location node ID
+
+        Returns:
+            Dictionary with all reachable destinations
+        """
+        return self._current_state().reachable_from(location_id)
+
+
+# Process-wide calculator shared by views and tasks, so the graph survives
+# between requests and is only reloaded when the network version changes
+ROUTE_CALCULATOR = RouteCalculator()
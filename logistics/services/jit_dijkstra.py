@@ -0,0 +1,180 @@
+"""
+Numba-compiled Dijkstra over CSR arrays.
+
+Used by the route calculator for point-to-point routes (a bidirectional
+search csgraph has no equivalent of) and in place of scipy.sparse.csgraph
+when SciPy isn't installed. Results follow csgraph's conventions:
+unreachable nodes (or nodes beyond `limit`) have distance inf and
+predecessor -9999.
+"""
+import numpy as np
+from numba import njit
+
+
+NO_PREDECESSOR = -9999
+
+
+@njit(cache=True)
+def _heap_push(keys, vals, size, key, val):
+    i = size
+    keys[i] = key
+    vals[i] = val
+    while i > 0:
+        parent = (i - 1) // 2
+        if keys[parent] <= keys[i]:
+            break
+        keys[i], keys[parent] = keys[parent], keys[i]
+        vals[i], vals[parent] = vals[parent], vals[i]
+        i = parent
+    return size + 1
+
+
+@njit(cache=True)
+def _heap_pop(keys, vals, size):
+    key = keys[0]
+    val = vals[0]
+    size -= 1
+    keys[0] = keys[size]
+    vals[0] = vals[size]
+    i = 0
+    while True:
+        smallest = i
+        left = 2 * i + 1
+        right = left + 1
+        if left < size and keys[left] < keys[smallest]:
+            smallest = left
+        if right < size and keys[right] < keys[smallest]:
+            smallest = right
+        if smallest == i:
+            break
+        keys[i], keys[smallest] = keys[smallest], keys[i]
+        vals[i], vals[smallest] = vals[smallest], vals[i]
+        i = smallest
+    return key, val, size
+
+
+@njit(cache=True)
+def dijkstra(indptr, indices, weights, src, n, limit):
+    """
+    Single-source shortest paths on a CSR graph.
+
+    The frontier is a binary heap stored as two parallel arrays (float64
+    keys, int32 node rows). Stale entries are skipped when popped instead
+    of being decreased in place, so the heap needs room for one entry per
+    edge plus the source.
+
+    Returns:
+        (dist, pred) arrays of length n
+    """
+    dist = np.full(n, np.inf)
+    pred = np.full(n, NO_PREDECESSOR, dtype=np.int32)
+    settled = np.zeros(n, dtype=np.bool_)
+
+    keys = np.empty(len(indices) + 1, dtype=np.float64)
+    vals = np.empty(len(indices) + 1, dtype=np.int32)
+
+    dist[src] = 0.0
+    size = _heap_push(keys, vals, 0, 0.0, src)
+
+    while size > 0:
+        d, u, size = _heap_pop(keys, vals, size)
+        if settled[u]:
+            continue
+        settled[u] = True
+
+        for offset in range(indptr[u], indptr[u + 1]):
+            v = indices[offset]
+            candidate = d + weights[offset]
+            if candidate < dist[v] and candidate <= limit:
+                dist[v] = candidate
+                pred[v] = u
+                size = _heap_push(keys, vals, size, candidate, v)
+
+    return dist, pred
+
+
+@njit(cache=True)
+def bidirectional_dijkstra(indptr, indices, weights, rev_indptr, rev_indices, rev_weights, src, dst, n):
+    """
+    Point-to-point shortest path, searching from both ends at once.
+
+    The forward search runs on the CSR graph from src and the backward
+    search on its transpose from dst; each step settles the nearer of the
+    two frontier tops. Every label improvement on a node the other side
+    has reached is a candidate route, and the search stops as soon as the
+    two frontier distances together reach the best candidate, since no
+    route through unsettled nodes can be shorter.
+
+    Returns:
+        (total, meet, pred_f, pred_b): meet is -1 if dst is unreachable;
+        pred_f leads from meet back to src and pred_b from meet on to dst
+    """
+    dist_f = np.full(n, np.inf)
+    dist_b = np.full(n, np.inf)
+    pred_f = np.full(n, NO_PREDECESSOR, dtype=np.int32)
+    pred_b = np.full(n, NO_PREDECESSOR, dtype=np.int32)
+    settled_f = np.zeros(n, dtype=np.bool_)
+    settled_b = np.zeros(n, dtype=np.bool_)
+
+    keys_f = np.empty(len(indices) + 1, dtype=np.float64)
+    vals_f = np.empty(len(indices) + 1, dtype=np.int32)
+    keys_b = np.empty(len(indices) + 1, dtype=np.float64)
+    vals_b = np.empty(len(indices) + 1, dtype=np.int32)
+
+    dist_f[src] = 0.0
+    dist_b[dst] = 0.0
+    size_f = _heap_push(keys_f, vals_f, 0, 0.0, src)
+    size_b = _heap_push(keys_b, vals_b, 0, 0.0, dst)
+
+    best = np.inf
+    meet = -1
+
+    while size_f > 0 and size_b > 0:
+        if keys_f[0] + keys_b[0] >= best:
+            break
+
+        if keys_f[0] <= keys_b[0]:
+            d, u, size_f = _heap_pop(keys_f, vals_f, size_f)
+            if settled_f[u]:
+                continue
+            settled_f[u] = True
+
+            for offset in range(indptr[u], indptr[u + 1]):
+                v = indices[offset]
+                candidate = d + weights[offset]
+                if candidate < dist_f[v]:
+                    dist_f[v] = candidate
+                    pred_f[v] = u
+                    size_f = _heap_push(keys_f, vals_f, size_f, candidate, v)
+                    if candidate + dist_b[v] < best:
+                        best = candidate + dist_b[v]
+                        meet = v
+        else:
+            d, u, size_b = _heap_pop(keys_b, vals_b, size_b)
+            if settled_b[u]:
+                continue
+            settled_b[u] = True
+
+            for offset in range(rev_indptr[u], rev_indptr[u + 1]):
+                v = rev_indices[offset]
+                candidate = d + rev_weights[offset]
+                if candidate < dist_b[v]:
+                    dist_b[v] = candidate
+                    pred_b[v] = u
+                    size_b = _heap_push(keys_b, vals_b, size_b, candidate, v)
+                    if candidate + dist_f[v] < best:
+                        best = candidate + dist_f[v]
+                        meet = v
+
+    return best, meet, pred_f, pred_b
+
+
+def warm_up() -> None:
+    """Compile (or load from the on-disk cache) the JIT-ed searches."""
+    indptr = np.array([0, 1, 1], dtype=np.int32)
+    indices = np.array([1], dtype=np.int32)
+    weights = np.array([1.0], dtype=np.float64)
+    rev_indptr = np.array([0, 0, 1], dtype=np.int32)
+    rev_indices = np.array([0], dtype=np.int32)
+    dijkstra(indptr, indices, weights, 0, 2, np.inf)
+    bidirectional_dijkstra(indptr, indices, weights, rev_indptr, rev_indices, weights, 0, 1, 2)
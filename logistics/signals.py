@@ -0,0 +1,50 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import LocationNode, Package, RouteEdge
+from .services.broadcast import (
+    ROUTE_VISIBLE_STATES,
+    publish_edge_removed,
+    publish_edge_status,
+    publish_package_removed,
+)
+from .services.graph_engine import ROUTE_CALCULATOR, bump_graph_version
+from .tasks import schedule_graph_rebuild
+
+
+@receiver(post_save, sender=LocationNode)
+@receiver(post_delete, sender=LocationNode)
+@receiver(post_save, sender=RouteEdge)
+@receiver(post_delete, sender=RouteEdge)
+def invalidate_route_graph(sender, **kwargs):
+    """Move every process onto a fresh graph once the change is committed."""
+    # Robust: the change is committed either way, and a cache outage must
+    # not turn the request that made it into an error
+    transaction.on_commit(bump_graph_version, robust=True)
+    # This process needn't wait for the version check to notice
+    transaction.on_commit(ROUTE_CALCULATOR.invalidate, robust=True)
+    # Rebuild the shared graph (and all-pairs paths) once the edits settle
+    transaction.on_commit(schedule_graph_rebuild, robust=True)
+
+
+@receiver(post_save, sender=RouteEdge)
+def publish_route_change(sender, instance, **kwargs):
+    """Tell route visualization clients if the edge status changed."""
+    edge_id, status = instance.id, instance.status
+    transaction.on_commit(lambda: publish_edge_status(edge_id, status), robust=True)
+
+
+@receiver(post_delete, sender=RouteEdge)
+def publish_route_removal(sender, instance, **kwargs):
+    """Tell route visualization clients to drop a deleted edge."""
+    edge_id = instance.id
+    transaction.on_commit(lambda: publish_edge_removed(edge_id), robust=True)
+
+
+@receiver(post_delete, sender=Package)
+def publish_package_removal(sender, instance, **kwargs):
+    """Drop a deleted package from route visualization clients if it was shown."""
+    if instance.state in ROUTE_VISIBLE_STATES:
+        tracking_id = instance.tracking_id
+        transaction.on_commit(lambda: publish_package_removed(tracking_id), robust=True)
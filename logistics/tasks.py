@@ -1,10 +1,40 @@
-from celery import shared_task
+from celery import Task, shared_task
+from django.conf import settings
 from django.core.cache import cache
 import time
-from .services.graph_engine import RouteCalculator
+from .services.broadcast import (
+    broadcast_package_update,
+    broadcast_package_updates,
+    broadcast_task_complete,
+    broadcast_task_failed,
+    publish_package_position,
+    publish_package_positions,
+)
+from .services.graph_engine import ROUTE_CALCULATOR
 
+# Network edits within this many seconds share one graph rebuild
+GRAPH_REBUILD_DEBOUNCE = 5
+GRAPH_REBUILD_PENDING_KEY = 'graph_rebuild_pending'
+GRAPH_REBUILD_PENDING_TIMEOUT = 60
 
-@shared_task(bind=True, name='logistics.calculate_route_async')
+
+class BroadcastResultTask(Task):
+    """
+    Pushes the task's outcome to clients subscribed to ws/tasks/{id}/.
+    
+    Celery calls these hooks after the result is stored in the backend,
+    so a client that subscribes late and then reads the backend sees
+    either the push or the stored result.
+    """
+    
+    def on_success(self, retval, task_id, args, kwargs):
+        broadcast_task_complete(task_id, retval)
+    
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        broadcast_task_failed(task_id, exc)
+
+
+@shared_task(bind=True, base=BroadcastResultTask, name='logistics.calculate_route_async')
 def calculate_route_async(self, source_id, destination_id, optimize_by='time'):
     """
     Async task for route calculation.
@@ -21,20 +51,17 @@ def calculate_route_async(self, source_id, destination_id, optimize_by='time'):
     # Update task state to show progress
     self.update_state(state='PROCESSING', meta={'status': 'Building graph...'})
     
-    calculator = RouteCalculator()
+    ROUTE_CALCULATOR.build_graph()
     
     self.update_state(state='PROCESSING', meta={'status': 'Calculating route...'})
     
-    result = calculator.calculate_shortest_path(
+    result = ROUTE_CALCULATOR.calculate_shortest_path(
         source_id=source_id,
         destination_id=destination_id,
         optimize_by=optimize_by
     )
     
-    # Cache the result for 5 minutes
-    cache_key = f'route_{source_id}_{destination_id}_{optimize_by}'
-    cache.set(cache_key, result, 300)
-    
+    # Clients subscribed to ws/tasks/{id}/ get the result from on_success
     return result
 
 
@@ -44,17 +71,33 @@ def rebuild_graph_cache():
     Rebuild the route graph cache.
     This can be triggered periodically or when routes are updated.
     """
-    calculator = RouteCalculator()
-    calculator.build_graph(force_rebuild=True)
+    # Edits from here on need another rebuild
+    cache.delete(GRAPH_REBUILD_PENDING_KEY)
+    
+    ROUTE_CALCULATOR.build_graph(force_rebuild=True)
+    all_pairs = ROUTE_CALCULATOR.precompute_all_pairs()
     
     return {
         'status': 'success',
         'message': 'Graph cache rebuilt',
-        'nodes': len(calculator.graph.nodes()),
-        'edges': len(calculator.graph.edges())
+        'version': ROUTE_CALCULATOR.graph_version,
+        'all_pairs_precomputed': all_pairs,
+        'nodes': ROUTE_CALCULATOR.node_count,
+        'edges': ROUTE_CALCULATOR.edge_count
     }
 
 
+def schedule_graph_rebuild():
+    """
+    Queue rebuild_graph_cache, unless a queued one hasn't started yet.
+    
+    The task is delayed by GRAPH_REBUILD_DEBOUNCE seconds, so a burst of
+    location or route saves is solved once, at the version it ends on.
+    """
+    if cache.add(GRAPH_REBUILD_PENDING_KEY, True, GRAPH_REBUILD_PENDING_TIMEOUT):
+        rebuild_graph_cache.apply_async(countdown=GRAPH_REBUILD_DEBOUNCE)
+
+
 @shared_task(name='logistics.update_package_location')
 def update_package_location(package_id, new_location_id):
     """
@@ -62,33 +105,125 @@ def update_package_location(package_id, new_location_id):
     This simulates package movement through the network.
     """
     from .models import Package, LocationNode
-    from django.shortcuts import get_object_or_404
+    from django.utils import timezone
     
     try:
-        package = get_object_or_404(Package, id=package_id)
-        new_location = get_object_or_404(LocationNode, id=new_location_id)
+        new_location = LocationNode.objects.filter(id=new_location_id).values(
+            'name', 'latitude', 'longitude'
+        ).first()
+        if new_location is None:
+            return {
+                'status': 'error',
+                'message': 'No LocationNode matches the given query.'
+            }
+        
+        # Optionally simulate processing time (demos only)
+        if settings.SIMULATE_PACKAGE_LATENCY:
+            time.sleep(settings.SIMULATE_PACKAGE_LATENCY)
         
-        # Simulate processing time
-        time.sleep(1)
+        # Equivalent of the move_to_location transition (in_transit -> in_transit)
+        # as one conditional UPDATE, so concurrent workers can't race on the row
+        moved = Package.objects.filter(id=package_id, state='in_transit').update(
+            current_location_id=new_location_id,
+            updated_at=timezone.now()
+        )
         
-        if package.state == 'in_transit':
-            package.move_to_location(new_location)
-            package.save()
+        package = Package.objects.filter(id=package_id).values('tracking_id', 'state').first()
+        if package is None:
+            return {
+                'status': 'error',
+                'message': 'No Package matches the given query.'
+            }
+        
+        if moved:
+            broadcast_package_update(package['tracking_id'], {
+                'tracking_id': package['tracking_id'],
+                'state': package['state'],
+                'current_location': new_location['name'],
+                'current_coordinates': {
+                    'latitude': new_location['latitude'],
+                    'longitude': new_location['longitude']
+                }
+            })
+            publish_package_position(
+                package['tracking_id'],
+                new_location['latitude'],
+                new_location['longitude']
+            )
             
             return {
                 'status': 'success',
                 'package_id': package_id,
-                'tracking_id': package.tracking_id,
-                'new_location': new_location.name
+                'tracking_id': package['tracking_id'],
+                'new_location': new_location['name']
             }
         else:
             return {
                 'status': 'error',
-                'message': f'Package must be in transit. Current state: {package.state}'
+                'message': f'Package must be in transit. Current state: {package["state"]}'
             }
             
     except Exception as e:
         return {
             'status': 'error',
             'message': str(e)
-        }
\ No newline at end of file
+        }
+
+
+@shared_task(name='logistics.update_package_locations')
+def update_package_locations(moves):
+    """
+    Move many packages at once (e.g. a warehouse sweep).
+    
+    Same rules as update_package_location, but the websocket updates for
+    the whole batch are published together: one route_delta listing every
+    moved package, and the per-package tracking updates sent concurrently.
+    
+    Args:
+        moves: List of [package_id, new_location_id] pairs
+    """
+    from .models import Package, LocationNode
+    from django.db import transaction
+    from django.utils import timezone
+    
+    location_ids = {location_id for _, location_id in moves}
+    locations = {
+        location['id']: location
+        for location in LocationNode.objects.filter(id__in=location_ids).values(
+            'id', 'name', 'latitude', 'longitude'
+        )
+    }
+    
+    now = timezone.now()
+    moved = {}
+    with transaction.atomic():
+        for package_id, location_id in moves:
+            if location_id in locations and Package.objects.filter(
+                id=package_id, state='in_transit'
+            ).update(current_location_id=location_id, updated_at=now):
+                moved[package_id] = locations[location_id]
+    
+    packages = Package.objects.filter(id__in=moved).values('id', 'tracking_id', 'state')
+    updates = {}
+    positions = []
+    for package in packages:
+        location = moved[package['id']]
+        updates[package['tracking_id']] = {
+            'tracking_id': package['tracking_id'],
+            'state': package['state'],
+            'current_location': location['name'],
+            'current_coordinates': {
+                'latitude': location['latitude'],
+                'longitude': location['longitude']
+            }
+        }
+        positions.append((package['tracking_id'], location['latitude'], location['longitude']))
+    
+    broadcast_package_updates(updates)
+    publish_package_positions(positions)
+    
+    return {
+        'status': 'success',
+        'moved': len(moved),
+        'skipped': len(moves) - len(moved)
+    }
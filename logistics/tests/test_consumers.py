@@ -0,0 +1,257 @@
+from unittest import mock
+
+import msgpack
+from asgiref.sync import sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from logistics.models import LocationNode, Package, RouteEdge
+from logistics.routing import websocket_urlpatterns
+from logistics.services import broadcast
+from logistics.services.graph_engine import ROUTE_CALCULATOR
+from logistics.tasks import calculate_route_async
+
+from .utils import IN_MEMORY_CHANNEL_LAYERS, LOCMEM_CACHE
+
+# The websocket routes alone; config.asgi would also start the graph warm-up
+application = URLRouter(websocket_urlpatterns)
+
+
+@override_settings(CACHES=LOCMEM_CACHE, CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class RouteVisualizationConsumerTests(TestCase):
+    """A snapshot on connect, then one route_delta per change."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.hub = LocationNode.objects.create(name='Hub', node_type='warehouse', latitude=51.5, longitude=-0.12)
+        cls.city = LocationNode.objects.create(name='City', node_type='city', latitude=52.2, longitude=0.12)
+        cls.edge = RouteEdge.objects.create(source=cls.hub, destination=cls.city,
+                                            distance_km=80, travel_time_minutes=60)
+        cls.moving = Package.objects.create(origin=cls.hub, current_location=cls.hub,
+                                            destination=cls.city, weight_kg=2, state='in_transit')
+        cls.pending = Package.objects.create(origin=cls.hub, current_location=cls.hub,
+                                             destination=cls.city, weight_kg=1)
+
+    def setUp(self):
+        # Forget the last-published state between tests
+        cache.clear()
+
+    async def connect(self):
+        communicator = WebsocketCommunicator(application, '/ws/routes/')
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    def transition(self, package, **data):
+        """POST a transition and run its publishes as if it committed."""
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(f'/api/packages/{package.pk}/transition/', data,
+                                    content_type='application/json')
+
+    async def test_snapshot_lists_edges_and_moving_packages(self):
+        communicator = await self.connect()
+
+        message = await communicator.receive_json_from()
+        self.assertEqual(message['type'], 'route_snapshot')
+        self.assertEqual(message['data'], {
+            'edges': [{'edge_id': self.edge.id, 'status': 'active'}],
+            'packages': [{'tracking_id': self.moving.tracking_id, 'lat': 51.5, 'lon': -0.12}],
+        })
+        await communicator.disconnect()
+
+    async def test_msgpack_clients_get_binary_frames(self):
+        communicator = WebsocketCommunicator(application, '/ws/routes/', subprotocols=['msgpack'])
+        connected, subprotocol = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertEqual(subprotocol, 'msgpack')
+
+        frame = await communicator.receive_from()
+        self.assertIsInstance(frame, bytes)
+        self.assertEqual(msgpack.unpackb(frame)['type'], 'route_snapshot')
+        await communicator.disconnect()
+
+    async def test_edge_deltas(self):
+        communicator = await self.connect()
+        await communicator.receive_json_from()
+
+        # Only a status change is published, and only once
+        self.assertTrue(await sync_to_async(broadcast.publish_edge_status)(self.edge.id, 'closed'))
+        self.assertFalse(await sync_to_async(broadcast.publish_edge_status)(self.edge.id, 'closed'))
+        message = await communicator.receive_json_from()
+        self.assertEqual(message, {'type': 'route_delta', 'data': {'edge_id': self.edge.id, 'status': 'closed'}})
+
+        await sync_to_async(broadcast.publish_edge_removed)(self.edge.id)
+        message = await communicator.receive_json_from()
+        self.assertEqual(message['data'], {'edge_id': self.edge.id, 'status': None})
+
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+    async def test_bulk_moves_share_one_delta(self):
+        communicator = await self.connect()
+        await communicator.receive_json_from()
+
+        sent = await sync_to_async(broadcast.publish_package_positions)([
+            ('PKG-A', 1.0, 2.0), ('PKG-B', 3.0, 4.0),
+        ])
+        self.assertEqual(sent, 2)
+        message = await communicator.receive_json_from()
+        self.assertEqual(message['data'], [
+            {'tracking_id': 'PKG-A', 'lat': 1.0, 'lon': 2.0},
+            {'tracking_id': 'PKG-B', 'lat': 3.0, 'lon': 4.0},
+        ])
+        self.assertEqual(await sync_to_async(broadcast.publish_package_positions)([('PKG-A', 1.0, 2.0)]), 0)
+        await communicator.disconnect()
+
+    async def test_transitions_publish_package_deltas(self):
+        communicator = await self.connect()
+        await communicator.receive_json_from()
+
+        response = await sync_to_async(self.transition)(self.pending, action='start_transit')
+        self.assertEqual(response.status_code, 200)
+        message = await communicator.receive_json_from()
+        self.assertEqual(message['data'], {'tracking_id': self.pending.tracking_id, 'lat': 51.5, 'lon': -0.12})
+
+        response = await sync_to_async(self.transition)(
+            self.pending, action='move_to_location', new_location_id=self.city.id
+        )
+        self.assertEqual(response.status_code, 200)
+        message = await communicator.receive_json_from()
+        self.assertEqual(message['data'], {'tracking_id': self.pending.tracking_id, 'lat': 52.2, 'lon': 0.12})
+
+        response = await sync_to_async(self.transition)(self.pending, action='cancel')
+        self.assertEqual(response.status_code, 200)
+        message = await communicator.receive_json_from()
+        self.assertEqual(message['data'], {'tracking_id': self.pending.tracking_id, 'removed': True})
+
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+    async def test_deleting_a_moving_package_drops_it(self):
+        communicator = await self.connect()
+        await communicator.receive_json_from()
+
+        def delete(package):
+            with self.captureOnCommitCallbacks(execute=True):
+                package.delete()
+
+        await sync_to_async(delete)(self.pending)
+        await sync_to_async(delete)(self.moving)
+        message = await communicator.receive_json_from()
+        self.assertEqual(message['data'], {'tracking_id': self.moving.tracking_id, 'removed': True})
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+    def test_publish_failure_does_not_fail_the_transition(self):
+        with mock.patch('logistics.views.publish_package_position', side_effect=ConnectionError), \
+                self.assertLogs('django.test', 'ERROR'):
+            response = self.transition(self.pending, action='start_transit')
+
+        self.assertEqual(response.status_code, 200)
+        self.pending.refresh_from_db()
+        self.assertEqual(self.pending.state, 'in_transit')
+
+    def test_nothing_is_published_before_commit(self):
+        with mock.patch('logistics.views.publish_package_position') as publish, \
+                self.captureOnCommitCallbacks() as callbacks:
+            self.client.post(f'/api/packages/{self.pending.pk}/transition/', {'action': 'start_transit'},
+                             content_type='application/json')
+            publish.assert_not_called()
+
+        self.assertEqual(len(callbacks), 1)
+
+
+@override_settings(CACHES=LOCMEM_CACHE, CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class TaskStatusConsumerTests(TestCase):
+    """ws/tasks/{id}/ delivers one task_complete, pushed or caught up, then closes."""
+
+    task_id = 'route-task-1'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.hub = LocationNode.objects.create(name='Hub', node_type='warehouse', latitude=51.5, longitude=-0.12)
+        cls.city = LocationNode.objects.create(name='City', node_type='city', latitude=52.2, longitude=0.12)
+        RouteEdge.objects.create(source=cls.hub, destination=cls.city, distance_km=80, travel_time_minutes=60)
+
+    def setUp(self):
+        cache.clear()
+        ROUTE_CALCULATOR.invalidate()
+        self.addCleanup(ROUTE_CALCULATOR.invalidate)
+
+        # The result backend, as the consumer reads it
+        patcher = mock.patch('logistics.consumers.AsyncResult')
+        self.get_task_meta = patcher.start().return_value.backend.get_task_meta
+        self.get_task_meta.return_value = {'status': 'PENDING', 'result': None}
+        self.addCleanup(patcher.stop)
+
+    async def connect(self):
+        communicator = WebsocketCommunicator(application, f'/ws/tasks/{self.task_id}/')
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def assertClosed(self, communicator):
+        self.assertEqual((await communicator.receive_output())['type'], 'websocket.close')
+
+    def run_task(self, *args):
+        """Run calculate_route_async in-process, as a worker would."""
+        with mock.patch.object(calculate_route_async, 'update_state'):
+            return calculate_route_async.apply(args, task_id=self.task_id)
+
+    async def test_result_is_pushed(self):
+        communicator = await self.connect()
+        self.assertTrue(await communicator.receive_nothing())
+
+        await sync_to_async(self.run_task)(self.hub.id, self.city.id)
+
+        message = await communicator.receive_json_from()
+        self.assertEqual(message['type'], 'task_complete')
+        self.assertEqual(message['data']['task_id'], self.task_id)
+        self.assertEqual(message['data']['state'], 'SUCCESS')
+        self.assertEqual(message['data']['result']['route']['summary']['total_time_minutes'], 60)
+        await self.assertClosed(communicator)
+
+    async def test_failure_is_pushed(self):
+        communicator = await self.connect()
+
+        with mock.patch.object(ROUTE_CALCULATOR, 'calculate_shortest_path', side_effect=RuntimeError('graph gone')):
+            result = await sync_to_async(self.run_task)(self.hub.id, self.city.id)
+        self.assertEqual(result.state, 'FAILURE')
+
+        message = await communicator.receive_json_from()
+        self.assertEqual(message['data'], {'task_id': self.task_id, 'state': 'FAILURE', 'error': 'graph gone'})
+        await self.assertClosed(communicator)
+
+    async def test_finished_task_is_caught_up(self):
+        self.get_task_meta.return_value = {'status': 'SUCCESS', 'result': {'status': 'success'}}
+
+        communicator = await self.connect()
+
+        message = await communicator.receive_json_from()
+        self.assertEqual(message['data'], {'task_id': self.task_id, 'state': 'SUCCESS', 'result': {'status': 'success'}})
+        await self.assertClosed(communicator)
+        self.get_task_meta.assert_called_once_with(self.task_id)
+
+    async def test_gives_up_after_the_timeout(self):
+        with mock.patch('logistics.consumers.TASK_STATUS_TIMEOUT', 0):
+            communicator = await self.connect()
+            await self.assertClosed(communicator)
+
+        # One look on connect and a last one before closing
+        self.assertEqual(self.get_task_meta.call_count, 2)
+
+    async def test_timeout_sends_a_result_whose_push_was_lost(self):
+        self.get_task_meta.side_effect = [
+            {'status': 'PENDING', 'result': None},
+            {'status': 'FAILURE', 'result': RuntimeError('graph gone')},
+        ]
+
+        with mock.patch('logistics.consumers.TASK_STATUS_TIMEOUT', 0):
+            communicator = await self.connect()
+            message = await communicator.receive_json_from()
+            await self.assertClosed(communicator)
+
+        self.assertEqual(message['data']['state'], 'FAILURE')
+        self.assertEqual(message['data']['error'], 'graph gone')
@@ -0,0 +1,98 @@
+from django.test import TestCase, override_settings
+
+from logistics.models import LocationNode, Package, RouteEdge
+
+from .utils import LOCMEM_CACHE
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class LocationNodeFilterTests(TestCase):
+    """?type= and ?active= narrow /api/locations/ in the query itself."""
+
+    @classmethod
+    def setUpTestData(cls):
+        LocationNode.objects.create(name='Depot', node_type='warehouse', latitude=0, longitude=0)
+        LocationNode.objects.create(name='Old Depot', node_type='warehouse', latitude=0, longitude=0,
+                                    is_active=False)
+        LocationNode.objects.create(name='Town', node_type='city', latitude=0, longitude=0)
+
+    def names(self, query):
+        response = self.client.get(f'/api/locations/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return [location['name'] for location in response.json()]
+
+    def test_filters(self):
+        for query, names in (
+            ('', ['Depot', 'Old Depot', 'Town']),
+            ('type=warehouse', ['Depot', 'Old Depot']),
+            ('active=true', ['Depot', 'Town']),
+            ('active=false', ['Old Depot']),
+            ('type=warehouse&active=true', ['Depot']),
+            ('type=customer', []),
+        ):
+            with self.subTest(query=query):
+                self.assertEqual(self.names(query), names)
+
+    def test_filtered_in_one_query(self):
+        with self.assertNumQueries(1):
+            self.names('type=warehouse&active=false')
+
+    def test_boolean_spellings(self):
+        for query, names in (
+            ('active=1', ['Depot', 'Town']),
+            ('active=False', ['Old Depot']),
+            ('active=0', ['Old Depot']),
+            # Not a boolean: the filter is left off rather than guessed
+            ('active=sometimes', ['Depot', 'Old Depot', 'Town']),
+        ):
+            with self.subTest(query=query):
+                self.assertEqual(self.names(query), names)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class RouteAndPackageFilterTests(TestCase):
+    """RouteEdgeFilter and PackageFilter validate their params before querying."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.hub = LocationNode.objects.create(name='Hub', node_type='warehouse', latitude=0, longitude=0)
+        cls.city = LocationNode.objects.create(name='City', node_type='city', latitude=0, longitude=0)
+        cls.outbound = RouteEdge.objects.create(source=cls.hub, destination=cls.city,
+                                                distance_km=5, travel_time_minutes=10)
+        cls.inbound = RouteEdge.objects.create(source=cls.city, destination=cls.hub,
+                                               distance_km=5, travel_time_minutes=10, status='closed')
+        cls.pending = Package.objects.create(origin=cls.hub, current_location=cls.hub,
+                                             destination=cls.city, weight_kg=1)
+        cls.moving = Package.objects.create(origin=cls.hub, current_location=cls.hub,
+                                            destination=cls.city, weight_kg=1, state='in_transit')
+
+    def test_route_filters(self):
+        for query, edges in (
+            (f'source={self.hub.id}', [self.outbound]),
+            ('status=closed', [self.inbound]),
+            (f'source={self.hub.id}&status=closed', []),
+        ):
+            with self.subTest(query=query):
+                response = self.client.get(f'/api/routes/?{query}')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual([edge['id'] for edge in response.json()], [edge.id for edge in edges])
+
+    def test_non_numeric_source_is_400(self):
+        response = self.client.get('/api/routes/?source=abc')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('source', response.json())
+
+    def test_package_filters(self):
+        for query, packages in (
+            ('state=in_transit', [self.moving]),
+            (f'tracking_id={self.pending.tracking_id}', [self.pending]),
+            ('state=delivered', []),
+        ):
+            with self.subTest(query=query):
+                response = self.client.get(f'/api/packages/?{query}')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    [package['tracking_id'] for package in response.json()['results']],
+                    [package.tracking_id for package in packages]
+                )
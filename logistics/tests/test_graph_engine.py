@@ -0,0 +1,333 @@
+import heapq
+import importlib.util
+import random
+import unittest
+from decimal import Decimal
+from unittest import mock
+
+import numpy as np
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from logistics.models import LocationNode, Package, RouteEdge
+from logistics.services import graph_engine
+from logistics.services.graph_engine import ROUTE_CALCULATOR, GraphState, RouteCalculator
+
+from .utils import LOCMEM_CACHE, METRICS
+
+
+HAS_NUMBA = importlib.util.find_spec('numba') is not None
+
+
+def reference_distances(source_id, metric):
+    """
+    Textbook heapq Dijkstra over the ORM rows, applying the routing rules
+    directly: closed routes and inactive locations are skipped and slow
+    routes take 50% longer.
+    """
+    active = set(LocationNode.objects.filter(is_active=True).values_list('id', flat=True))
+    adjacency = {}
+    for edge in RouteEdge.objects.all():
+        if edge.status == 'closed' or not {edge.source_id, edge.destination_id} <= active:
+            continue
+        weight = {
+            'time': edge.travel_time_minutes * (1.5 if edge.status == 'slow' else 1),
+            'distance': edge.distance_km,
+            'cost': float(edge.cost_per_km) * edge.distance_km,
+        }[metric]
+        adjacency.setdefault(edge.source_id, []).append((edge.destination_id, weight))
+
+    dist = {source_id: 0.0}
+    heap = [(0.0, source_id)]
+    while heap:
+        d, node = heapq.heappop(heap)
+        if d > dist[node]:
+            continue
+        for neighbour, weight in adjacency.get(node, ()):
+            if d + weight < dist.get(neighbour, float('inf')):
+                dist[neighbour] = d + weight
+                heapq.heappush(heap, (d + weight, neighbour))
+    return dist
+
+
+class UnavailableCache:
+    """Stands in for a cache whose server is down: every call raises."""
+
+    def __getattr__(self, name):
+        def unavailable(*args, **kwargs):
+            raise ConnectionError('cache unavailable')
+        return unavailable
+
+
+def path_weight(state, metric, rows):
+    return sum(
+        float(state.weights[metric][state.edge_lookup[hop]])
+        for hop in zip(rows[:-1], rows[1:])
+    )
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class RouteEngineTests(TestCase):
+    """The CSR engine against a reference Dijkstra on a random network."""
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(7)
+        cls.nodes = [
+            LocationNode.objects.create(
+                name=f'Node {i}', node_type='city',
+                latitude=i, longitude=-i,
+                is_active=i % 9 != 4
+            )
+            for i in range(24)
+        ]
+        pairs = set()
+        while len(pairs) < 90:
+            pairs.add(tuple(rng.sample(range(len(cls.nodes)), 2)))
+        for i, j in sorted(pairs):
+            RouteEdge.objects.create(
+                source=cls.nodes[i],
+                destination=cls.nodes[j],
+                distance_km=rng.randint(1, 80),
+                travel_time_minutes=rng.randint(1, 90),
+                cost_per_km=Decimal(rng.randint(50, 300)) / 100,
+                status=rng.choice(['active', 'active', 'slow', 'closed'])
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.calculator = RouteCalculator()
+
+    def assertMatchesReference(self, calculator):
+        for source in self.nodes:
+            for metric in METRICS:
+                expected = reference_distances(source.id, metric)
+                for destination in self.nodes:
+                    result = calculator.calculate_shortest_path(source.id, destination.id, metric)
+                    with self.subTest(source=source.id, destination=destination.id, metric=metric):
+                        if not (source.is_active and destination.is_active):
+                            self.assertEqual(result['status'], 'error')
+                            self.assertIn('not found or inactive', result['error'])
+                        elif destination.id not in expected:
+                            self.assertEqual(result['error'], 'No route available between these locations')
+                        else:
+                            self.assertEqual(result['status'], 'success')
+                            self.assertRouteValid(result['route'], source, destination)
+                            summary = result['route']['summary']
+                            total = {
+                                'time': summary['total_time_minutes'],
+                                'distance': summary['total_distance_km'],
+                                'cost': summary['total_cost'],
+                            }[metric]
+                            self.assertAlmostEqual(
+                                total, expected[destination.id],
+                                delta=0.51 if metric == 'time' else 0.006
+                            )
+
+    def assertRouteValid(self, route, source, destination):
+        ids = [node['id'] for node in route['nodes']]
+        self.assertEqual((ids[0], ids[-1]), (source.id, destination.id))
+        self.assertEqual(len(route['segments']), len(ids) - 1)
+        for segment in route['segments']:
+            self.assertNotEqual(segment['status'], 'closed')
+
+    def test_matches_reference_dijkstra(self):
+        self.assertMatchesReference(self.calculator)
+
+    def test_closed_slow_and_inactive_routes(self):
+        a, b, c, d = (
+            LocationNode.objects.create(name=name, node_type='city', latitude=0, longitude=0)
+            for name in 'ABCD'
+        )
+        hidden = LocationNode.objects.create(
+            name='Hidden', node_type='city', latitude=0, longitude=0, is_active=False
+        )
+        RouteEdge.objects.create(source=a, destination=b, distance_km=1, travel_time_minutes=10,
+                                 cost_per_km=1, status='slow')
+        RouteEdge.objects.create(source=a, destination=c, distance_km=1, travel_time_minutes=14,
+                                 cost_per_km=1)
+        RouteEdge.objects.create(source=b, destination=d, distance_km=1, travel_time_minutes=1,
+                                 cost_per_km=1)
+        RouteEdge.objects.create(source=c, destination=d, distance_km=1, travel_time_minutes=1,
+                                 cost_per_km=1)
+        RouteEdge.objects.create(source=a, destination=d, distance_km=1, travel_time_minutes=1,
+                                 cost_per_km=1, status='closed')
+        RouteEdge.objects.create(source=a, destination=hidden, distance_km=1, travel_time_minutes=1,
+                                 cost_per_km=1)
+        RouteEdge.objects.create(source=hidden, destination=d, distance_km=1, travel_time_minutes=1,
+                                 cost_per_km=1)
+
+        route = self.calculator.calculate_shortest_path(a.id, d.id)['route']
+
+        # A->B is 15 minutes once slowed, so the 14 minute A->C leg wins
+        self.assertEqual([node['name'] for node in route['nodes']], ['A', 'C', 'D'])
+        self.assertEqual(route['summary']['total_time_minutes'], 15)
+        self.assertEqual(
+            self.calculator.calculate_shortest_path(a.id, hidden.id)['status'], 'error'
+        )
+        reachable = self.calculator.get_all_routes_from_location(a.id)
+        self.assertEqual(
+            {node['name']: node['estimated_time_minutes'] for node in reachable['reachable_destinations']},
+            {'B': 15, 'C': 14, 'D': 15}
+        )
+
+    def test_reachability_memoizes_compact_rows(self):
+        source = self.nodes[0]
+        first = self.calculator.get_all_routes_from_location(source.id)
+
+        times = reference_distances(source.id, 'time')
+        self.assertEqual(
+            {node['id']: node['estimated_time_minutes'] for node in first['reachable_destinations']},
+            {node_id: round(t, 0) for node_id, t in times.items() if node_id != source.id}
+        )
+
+        with mock.patch.object(GraphState, '_dijkstra', side_effect=AssertionError):
+            second = self.calculator.get_all_routes_from_location(source.id)
+
+        # Served from the memo, but as a fresh response the caller may mutate
+        self.assertEqual(second, first)
+        self.assertIsNot(second['reachable_destinations'], first['reachable_destinations'])
+        rows, travel_times = self.calculator.state.reachable_rows(self.calculator.node_index[source.id])
+        self.assertEqual((rows.dtype, travel_times.dtype), (np.int32, np.float64))
+
+    def test_point_to_point_search_matches_full_dijkstra(self):
+        self.calculator.build_graph()
+        state = self.calculator.state
+
+        for metric in METRICS:
+            for src_row in range(state.node_count):
+                dist, _ = state._dijkstra(metric, src_row)
+                for dst_row in range(state.node_count):
+                    rows = state._point_to_point_search(metric, src_row, dst_row)
+                    with self.subTest(metric=metric, src=src_row, dst=dst_row):
+                        if np.isinf(dist[dst_row]):
+                            self.assertIsNone(rows)
+                        else:
+                            self.assertEqual((rows[0], rows[-1]), (src_row, dst_row))
+                            self.assertAlmostEqual(path_weight(state, metric, rows), dist[dst_row])
+
+    def test_all_pairs_paths(self):
+        self.assertTrue(self.calculator.precompute_all_pairs())
+        state = self.calculator.state
+        self.assertEqual(set(state.apsp_pred), set(METRICS))
+
+        for metric in METRICS:
+            for src_row in range(state.node_count):
+                dist, _ = state._dijkstra(metric, src_row)
+                for dst_row in range(state.node_count):
+                    rows = state._path_from_predecessors(state.apsp_pred[metric][src_row], src_row, dst_row)
+                    with self.subTest(metric=metric, src=src_row, dst=dst_row):
+                        if np.isinf(dist[dst_row]):
+                            self.assertIsNone(rows)
+                        else:
+                            self.assertAlmostEqual(path_weight(state, metric, rows), dist[dst_row])
+
+        # Queries are answered from the matrices alone
+        with mock.patch.object(GraphState, '_point_to_point_search', side_effect=AssertionError):
+            self.assertMatchesReference(self.calculator)
+
+    def test_all_pairs_attached_once_published(self):
+        self.calculator.build_graph()
+        self.assertEqual(self.calculator.state.apsp_pred, {})
+
+        # Another process (the rebuild task) solves and stores the matrices
+        self.assertTrue(RouteCalculator().precompute_all_pairs())
+
+        self.calculator._apsp_checked_at -= graph_engine.APSP_RECHECK_INTERVAL
+        self.calculator.build_graph()
+        self.assertEqual(set(self.calculator.state.apsp_pred), set(METRICS))
+
+    def test_cache_outage_uses_in_process_graph(self):
+        with mock.patch.object(graph_engine, 'cache', UnavailableCache()), \
+                self.assertLogs('logistics.services.graph_engine', 'WARNING'):
+            self.assertMatchesReference(self.calculator)
+            self.assertIsNone(self.calculator.graph_version)
+            self.assertFalse(self.calculator.precompute_all_pairs())
+
+            # Loaded from the database once, then kept
+            state = self.calculator.state
+            with self.assertNumQueries(0):
+                self.calculator.build_graph()
+            self.assertIs(self.calculator.state, state)
+
+        # Back on the shared version once the cache answers again
+        self.calculator.build_graph()
+        self.assertEqual(self.calculator.graph_version, graph_engine.get_graph_version())
+
+    @unittest.skipUnless(HAS_NUMBA, 'numba is not installed')
+    def test_numba_fallback(self):
+        from logistics.services import jit_dijkstra
+
+        self.calculator.build_graph()
+        state = self.calculator.state
+        if graph_engine.csgraph is not None:
+            for metric in METRICS:
+                for limit in (np.inf, 40.0):
+                    for row in range(state.node_count):
+                        expected, expected_pred = graph_engine.csgraph.dijkstra(
+                            state.matrices[metric], indices=row, return_predecessors=True, limit=limit
+                        )
+                        dist, pred = jit_dijkstra.dijkstra(
+                            state.indptr, state.indices, state.weights[metric], row, state.node_count, limit
+                        )
+                        np.testing.assert_allclose(dist, expected)
+                        np.testing.assert_array_equal(pred < 0, expected_pred < 0)
+
+        # The whole engine on the JIT path, as it runs without SciPy
+        with mock.patch.multiple(graph_engine, csr_matrix=None, csgraph=None, jit_dijkstra=jit_dijkstra):
+            self.assertMatchesReference(RouteCalculator())
+
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class CacheOutageTests(TestCase):
+    """Route changes and route endpoints keep working without the cache."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.hub = LocationNode.objects.create(name='Hub', node_type='warehouse', latitude=0, longitude=0)
+        cls.city = LocationNode.objects.create(name='City', node_type='city', latitude=1, longitude=1)
+        cls.edge = RouteEdge.objects.create(source=cls.hub, destination=cls.city,
+                                            distance_km=10, travel_time_minutes=20, cost_per_km=1)
+        cls.package = Package.objects.create(origin=cls.hub, current_location=cls.hub,
+                                             destination=cls.city, weight_kg=1, state='in_transit')
+
+    def setUp(self):
+        cache.clear()
+        ROUTE_CALCULATOR.invalidate()
+        self.addCleanup(ROUTE_CALCULATOR.invalidate)
+
+        patcher = mock.patch.object(graph_engine, 'cache', UnavailableCache())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_route_change_commits_and_invalidates(self):
+        with self.assertLogs('logistics.services.graph_engine', 'WARNING'):
+            ROUTE_CALCULATOR.build_graph()
+
+        with mock.patch('logistics.signals.schedule_graph_rebuild'), \
+                self.assertLogs('django.test', 'ERROR'), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.edge.travel_time_minutes = 30
+            self.edge.save()
+
+        # The version bump failed, but this process still drops its graph
+        self.assertFalse(ROUTE_CALCULATOR.state.loaded)
+
+    def test_route_endpoints(self):
+        with self.assertLogs('logistics.services.graph_engine', 'WARNING'):
+            # Loads the graph on this thread; the async view's pool threads
+            # can't see the test transaction
+            response = self.client.get(f'/api/locations/{self.hub.id}/reachable/')
+            self.assertEqual(response.status_code, 200)
+
+            response = self.client.post('/api/calculate-route/', {
+                'source_id': self.hub.id, 'destination_id': self.city.id,
+            }, content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['route']['summary']['total_time_minutes'], 20)
+
+            response = self.client.get(f'/api/track/{self.package.tracking_id}/')
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('ETag', response)
+            self.assertIsNotNone(response.json()['route'])
@@ -0,0 +1,61 @@
+import json
+from decimal import Decimal
+
+from django.test import TestCase, override_settings
+from drf_orjson_renderer.renderers import ORJSONRenderer
+
+from logistics.models import LocationNode, RouteEdge
+from logistics.serializers import (
+    LocationNodeSerializer,
+    RouteEdgeSerializer,
+    serialize_location_rows,
+    serialize_route_edge_rows,
+)
+
+from .utils import LOCMEM_CACHE
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class ListSerializerTests(TestCase):
+    """values()-row list payloads render exactly like the ModelSerializers."""
+
+    @classmethod
+    def setUpTestData(cls):
+        hub = LocationNode.objects.create(
+            name='Hub', node_type='warehouse', latitude=51.5, longitude=-0.12, address='1 Dock Rd'
+        )
+        shop = LocationNode.objects.create(
+            name='Shop', node_type='customer', latitude=51.25, longitude=0, is_active=False
+        )
+        RouteEdge.objects.create(source=hub, destination=shop, distance_km=12.5,
+                                 travel_time_minutes=25, cost_per_km=Decimal('2.50'), status='slow')
+        RouteEdge.objects.create(source=shop, destination=hub, distance_km=12.5,
+                                 travel_time_minutes=20, cost_per_km=Decimal('1.75'))
+
+    def render(self, data):
+        return json.loads(ORJSONRenderer().render(data))
+
+    def test_location_rows(self):
+        queryset = LocationNode.objects.order_by('name')
+        self.assertEqual(
+            self.render(serialize_location_rows(queryset)),
+            self.render(LocationNodeSerializer(queryset, many=True).data)
+        )
+
+    def test_route_edge_rows(self):
+        queryset = RouteEdge.objects.select_related('source', 'destination').order_by('source__name')
+        self.assertEqual(
+            self.render(serialize_route_edge_rows(queryset)),
+            self.render(RouteEdgeSerializer(queryset, many=True).data)
+        )
+
+    def test_list_endpoints_render_rows_in_one_query(self):
+        for url, serializer, queryset in (
+            ('/api/locations/', LocationNodeSerializer, LocationNode.objects.all()),
+            ('/api/routes/', RouteEdgeSerializer, RouteEdge.objects.select_related('source', 'destination')),
+        ):
+            with self.subTest(url=url), self.assertNumQueries(1):
+                response = self.client.get(url)
+
+            self.assertEqual(response.status_code, 200)
+            self.assertCountEqual(response.json(), self.render(serializer(queryset, many=True).data))
@@ -0,0 +1,145 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from logistics.models import LocationNode, Package
+from logistics.services.broadcast import broadcast_package_updates
+from logistics.tasks import update_package_location, update_package_locations
+
+from .utils import LOCMEM_CACHE
+
+
+@override_settings(CACHES=LOCMEM_CACHE, SIMULATE_PACKAGE_LATENCY=0)
+class UpdatePackageLocationTests(TestCase):
+    """Packages move with one conditional UPDATE, and only while in transit."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.hub = LocationNode.objects.create(name='Hub', node_type='warehouse', latitude=51.5, longitude=-0.12)
+        cls.city = LocationNode.objects.create(name='City', node_type='city', latitude=52.2, longitude=0.12)
+
+    def setUp(self):
+        self.package = Package.objects.create(origin=self.hub, current_location=self.hub,
+                                              destination=self.city, weight_kg=1, state='in_transit')
+
+        for name in ('broadcast_package_update', 'publish_package_position'):
+            patcher = mock.patch(f'logistics.tasks.{name}')
+            setattr(self, name, patcher.start())
+            self.addCleanup(patcher.stop)
+
+    def test_moves_a_package_in_transit(self):
+        updated_at = self.package.updated_at
+
+        with CaptureQueriesContext(connection) as queries:
+            result = update_package_location(self.package.id, self.city.id)
+
+        # The new location, the UPDATE and the tracking id for the broadcast;
+        # the state check is part of the UPDATE, not a read before it
+        self.assertEqual(len(queries), 3)
+        update = queries[1]['sql']
+        self.assertTrue(update.startswith('UPDATE'))
+        self.assertIn("\"state\" = 'in_transit'", update)
+
+        self.assertEqual(result, {
+            'status': 'success',
+            'package_id': self.package.id,
+            'tracking_id': self.package.tracking_id,
+            'new_location': 'City',
+        })
+        self.package.refresh_from_db()
+        self.assertEqual(self.package.current_location_id, self.city.id)
+        self.assertGreater(self.package.updated_at, updated_at)
+
+        self.broadcast_package_update.assert_called_once_with(self.package.tracking_id, {
+            'tracking_id': self.package.tracking_id,
+            'state': 'in_transit',
+            'current_location': 'City',
+            'current_coordinates': {'latitude': 52.2, 'longitude': 0.12},
+        })
+        self.publish_package_position.assert_called_once_with(self.package.tracking_id, 52.2, 0.12)
+
+    def test_other_states_are_left_alone(self):
+        Package.objects.filter(pk=self.package.pk).update(state='out_for_delivery')
+
+        result = update_package_location(self.package.id, self.city.id)
+
+        self.assertEqual(result, {
+            'status': 'error',
+            'message': 'Package must be in transit. Current state: out_for_delivery',
+        })
+        self.package.refresh_from_db()
+        self.assertEqual(self.package.current_location_id, self.hub.id)
+        self.broadcast_package_update.assert_not_called()
+        self.publish_package_position.assert_not_called()
+
+    def test_unknown_package_or_location(self):
+        self.assertEqual(
+            update_package_location(self.package.id, self.city.id + 100),
+            {'status': 'error', 'message': 'No LocationNode matches the given query.'}
+        )
+        self.assertEqual(
+            update_package_location(self.package.id + 100, self.city.id),
+            {'status': 'error', 'message': 'No Package matches the given query.'}
+        )
+        self.broadcast_package_update.assert_not_called()
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class UpdatePackageLocationsTests(TestCase):
+    """Bulk moves apply the same rule and publish the batch together."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.hub = LocationNode.objects.create(name='Hub', node_type='warehouse', latitude=51.5, longitude=-0.12)
+        cls.city = LocationNode.objects.create(name='City', node_type='city', latitude=52.2, longitude=0.12)
+        cls.first, cls.second, cls.pending = (
+            Package.objects.create(origin=cls.hub, current_location=cls.hub, destination=cls.city,
+                                   weight_kg=1, state=state)
+            for state in ('in_transit', 'in_transit', 'pending')
+        )
+
+    def test_moves_in_one_batch(self):
+        with mock.patch('logistics.tasks.broadcast_package_updates') as broadcast, \
+                mock.patch('logistics.tasks.publish_package_positions') as publish:
+            result = update_package_locations([
+                [self.first.id, self.city.id],
+                [self.second.id, self.city.id],
+                [self.pending.id, self.city.id],
+                [self.first.id + 100, self.city.id],
+                [self.second.id, self.city.id + 100],
+            ])
+
+        self.assertEqual(result, {'status': 'success', 'moved': 2, 'skipped': 3})
+        self.assertEqual(
+            dict(Package.objects.values_list('tracking_id', 'current_location_id')),
+            {self.first.tracking_id: self.city.id, self.second.tracking_id: self.city.id,
+             self.pending.tracking_id: self.hub.id}
+        )
+
+        # One call each for the whole batch
+        updates, = broadcast.call_args.args
+        self.assertEqual(set(updates), {self.first.tracking_id, self.second.tracking_id})
+        self.assertEqual(updates[self.first.tracking_id]['current_location'], 'City')
+        positions, = publish.call_args.args
+        self.assertCountEqual(positions, [
+            (self.first.tracking_id, 52.2, 0.12),
+            (self.second.tracking_id, 52.2, 0.12),
+        ])
+
+    def test_package_updates_are_sent_to_each_group(self):
+        layer = mock.Mock(group_send=mock.AsyncMock())
+        with mock.patch('logistics.services.broadcast.get_channel_layer', return_value=layer):
+            broadcast_package_updates({
+                'PKG-A': {'tracking_id': 'PKG-A'},
+                'PKG-B': {'tracking_id': 'PKG-B'},
+            })
+
+        self.assertCountEqual(
+            [call.args[0] for call in layer.group_send.await_args_list],
+            ['package_PKG-A', 'package_PKG-B']
+        )
+        event = layer.group_send.await_args_list[0].args[1]
+        self.assertEqual(event['type'], 'package_update_raw')
+        self.assertEqual(set(event), {'type', 'json', 'msgpack'})
@@ -0,0 +1,343 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.middleware.csrf import CSRF_SECRET_LENGTH
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.throttling import AnonRateThrottle
+from rest_framework.views import APIView
+
+from logistics.models import LocationNode, Package, RouteEdge
+from logistics.pagination import PackageCursorPagination
+from logistics.serializers import PackageSerializer
+from logistics.services.graph_engine import ROUTE_CALCULATOR, bump_graph_version
+
+from .utils import LOCMEM_CACHE
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class PackageTransitionTests(TestCase):
+    """POST /api/packages/{id}/transition/ drives the package state machine."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.hub = LocationNode.objects.create(name='Hub', node_type='warehouse', latitude=51.5, longitude=-0.12)
+        cls.city = LocationNode.objects.create(name='City', node_type='city', latitude=52.2, longitude=0.12)
+
+    def setUp(self):
+        self.package = Package.objects.create(origin=self.hub, current_location=self.hub,
+                                              destination=self.city, weight_kg=2, description='Books')
+
+    def transition(self, **data):
+        return self.client.post(f'/api/packages/{self.package.pk}/transition/', data,
+                                content_type='application/json')
+
+    def test_disallowed_transition_is_400(self):
+        response = self.transition(action='complete_delivery')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'Transition failed: action not allowed in the current state'})
+        self.package.refresh_from_db()
+        self.assertEqual(self.package.state, 'pending')
+
+    def test_unknown_action_is_400(self):
+        response = self.transition(action='teleport')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('action', response.json())
+
+    def test_actions_dispatch_to_fsm_methods(self):
+        for data, state in (
+            ({'action': 'start_transit'}, 'in_transit'),
+            ({'action': 'move_to_location', 'new_location_id': self.city.id}, 'in_transit'),
+            ({'action': 'start_delivery'}, 'out_for_delivery'),
+            ({'action': 'complete_delivery'}, 'delivered'),
+        ):
+            with self.subTest(**data):
+                response = self.transition(**data)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()['state'], state)
+
+        self.package.refresh_from_db()
+        self.assertEqual(self.package.current_location_id, self.city.id)
+        self.assertIsNotNone(self.package.delivered_at)
+
+    def test_cancel_calls_cancel_package(self):
+        response = self.transition(action='cancel')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['state'], 'cancelled')
+
+    def test_move_needs_a_known_location(self):
+        self.transition(action='start_transit')
+
+        response = self.transition(action='move_to_location')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'new_location_id required for move_to_location'})
+
+        response = self.transition(action='move_to_location', new_location_id=self.city.id + 100)
+        self.assertEqual(response.status_code, 404)
+
+        self.package.refresh_from_db()
+        self.assertEqual(self.package.current_location_id, self.hub.id)
+
+    def test_response_is_the_saved_package_without_a_reload(self):
+        # The package (locations joined) and its UPDATE; nothing re-read
+        with self.assertNumQueries(2):
+            response = self.transition(action='start_transit')
+        self.assertEqual(response.json(), PackageSerializer(Package.objects.get(pk=self.package.pk)).data)
+
+        # Plus the new location
+        with self.assertNumQueries(3):
+            response = self.transition(action='move_to_location', new_location_id=self.city.id)
+        self.assertEqual(response.json()['current_location_name'], 'City')
+        self.assertEqual(response.json(), PackageSerializer(Package.objects.get(pk=self.package.pk)).data)
+
+    def test_saves_only_the_transition_columns(self):
+        updated_at = self.package.updated_at
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.transition(action='start_transit').status_code, 200)
+
+        update, = (query['sql'] for query in queries if query['sql'].startswith('UPDATE'))
+        for column in ('state', 'updated_at'):
+            self.assertIn(f'"{column}"', update)
+        for column in ('description', 'weight_kg', 'current_location_id', 'delivered_at'):
+            self.assertNotIn(f'"{column}"', update)
+
+        self.package.refresh_from_db()
+        self.assertEqual(self.package.state, 'in_transit')
+        self.assertGreater(self.package.updated_at, updated_at)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class TrackPackageTests(TestCase):
+    """GET /api/track/{tracking_id}/ returns the package and its remaining route."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.hub = LocationNode.objects.create(name='Hub', node_type='warehouse', latitude=51.5, longitude=-0.12)
+        cls.city = LocationNode.objects.create(name='City', node_type='city', latitude=52.2, longitude=0.12)
+        RouteEdge.objects.create(source=cls.hub, destination=cls.city, distance_km=80, travel_time_minutes=60)
+        cls.package = Package.objects.create(origin=cls.hub, current_location=cls.hub,
+                                             destination=cls.city, weight_kg=2, state='in_transit')
+
+    def setUp(self):
+        cache.clear()
+        ROUTE_CALCULATOR.invalidate()
+        self.addCleanup(ROUTE_CALCULATOR.invalidate)
+
+    def track(self, tracking_id=None, **headers):
+        return self.client.get(f'/api/track/{tracking_id or self.package.tracking_id}/', **headers)
+
+    def test_route_to_destination(self):
+        response = self.track()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['package']['tracking_id'], self.package.tracking_id)
+        route = response.json()['route']
+        self.assertEqual([node['name'] for node in route['nodes']], ['Hub', 'City'])
+        self.assertEqual(route['summary']['total_time_minutes'], 60)
+
+    def test_no_route_search_at_the_destination(self):
+        Package.objects.filter(pk=self.package.pk).update(current_location=self.city)
+
+        with mock.patch.object(ROUTE_CALCULATOR, 'calculate_shortest_path') as calculate:
+            response = self.track()
+
+        calculate.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.json()['route'])
+        self.assertEqual(response.json()['package']['current_location_name'], 'City')
+
+    def test_unknown_package_is_404(self):
+        response = self.track('PKG-MISSING')
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {'error': 'Package with tracking ID PKG-MISSING not found'})
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class ConditionalGetTests(TestCase):
+    """Reachability and tracking answer 304 until the package or network changes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.hub = LocationNode.objects.create(name='Hub', node_type='warehouse', latitude=51.5, longitude=-0.12)
+        cls.city = LocationNode.objects.create(name='City', node_type='city', latitude=52.2, longitude=0.12)
+        cls.closed = LocationNode.objects.create(name='Closed', node_type='city', latitude=0, longitude=0,
+                                                 is_active=False)
+        RouteEdge.objects.create(source=cls.hub, destination=cls.city, distance_km=80, travel_time_minutes=60)
+        cls.package = Package.objects.create(origin=cls.hub, current_location=cls.hub,
+                                             destination=cls.city, weight_kg=2, state='in_transit')
+
+    def setUp(self):
+        cache.clear()
+        ROUTE_CALCULATOR.invalidate()
+        self.addCleanup(ROUTE_CALCULATOR.invalidate)
+
+    def assertRevalidates(self, url):
+        """Return the ETag of url after checking a repeat with it is a 304."""
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        return etag
+
+    def test_reachable_destinations(self):
+        url = f'/api/locations/{self.hub.id}/reachable/'
+        etag = self.assertRevalidates(url)
+
+        # A network change moves the ETag on
+        bump_graph_version()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_unknown_or_inactive_location_404_has_no_etag(self):
+        for location_id in (self.closed.id, self.closed.id + 100):
+            with self.subTest(location_id=location_id):
+                response = self.client.get(f'/api/locations/{location_id}/reachable/')
+                self.assertEqual(response.status_code, 404)
+                self.assertNotIn('ETag', response)
+
+    def test_tracking(self):
+        url = f'/api/track/{self.package.tracking_id}/'
+        etag = self.assertRevalidates(url)
+
+        # The package moving on changes it
+        self.package.move_to_location(self.city)
+        self.package.save()
+        self.assertNotEqual(self.assertRevalidates(url), etag)
+
+        # So does the network its route is computed on
+        etag = self.client.get(url)['ETag']
+        bump_graph_version()
+        self.assertNotEqual(self.client.get(url)['ETag'], etag)
+
+    def test_unknown_tracking_id_404_has_no_etag(self):
+        response = self.client.get('/api/track/PKG-MISSING/')
+
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('ETag', response)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class PackageListTests(TestCase):
+    """The package list is cursor-paginated, newest first."""
+
+    @classmethod
+    def setUpTestData(cls):
+        hub = LocationNode.objects.create(name='Hub', node_type='warehouse', latitude=0, longitude=0)
+        cls.tracking_ids = [
+            Package.objects.create(origin=hub, current_location=hub, destination=hub, weight_kg=1).tracking_id
+            for _ in range(PackageCursorPagination.page_size + 5)
+        ]
+
+    def test_pages(self):
+        # One query per page: no COUNT(*) as with page numbers
+        with self.assertNumQueries(1):
+            first = self.client.get('/api/packages/').json()
+        self.assertEqual(set(first), {'next', 'previous', 'results'})
+        self.assertIsNone(first['previous'])
+        self.assertEqual(len(first['results']), PackageCursorPagination.page_size)
+
+        second = self.client.get(first['next']).json()
+        self.assertIsNone(second['next'])
+        self.assertIsNotNone(second['previous'])
+
+        listed = [package['tracking_id'] for package in first['results'] + second['results']]
+        self.assertEqual(listed, self.tracking_ids[::-1])
+
+    def test_invalid_cursor_is_404(self):
+        response = self.client.get('/api/packages/?cursor=bogus')
+
+        self.assertEqual(response.status_code, 404)
+
+
+class OneRequestThrottle(AnonRateThrottle):
+    rate = '1/minute'
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class CalculateRouteTests(TestCase):
+    """The async POST /api/calculate-route/ view and the DRF policy it applies."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.hub = LocationNode.objects.create(name='Hub', node_type='warehouse', latitude=51.5, longitude=-0.12)
+        cls.city = LocationNode.objects.create(name='City', node_type='city', latitude=52.2, longitude=0.12)
+        RouteEdge.objects.create(source=cls.hub, destination=cls.city, distance_km=80,
+                                 travel_time_minutes=60, cost_per_km=2)
+        cls.user = User.objects.create_user('dispatcher', password='secret')
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(ROUTE_CALCULATOR.invalidate)
+        # Loaded here: the search runs on _ROUTE_POOL, whose threads can't
+        # see the test transaction
+        ROUTE_CALCULATOR.build_graph(force_rebuild=True)
+
+    def calculate(self, client=None, **data):
+        return (client or self.client).post('/api/calculate-route/', data, content_type='application/json')
+
+    def test_route(self):
+        response = self.calculate(source_id=self.hub.id, destination_id=self.city.id, optimize_by='cost')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response.json()['route']['summary']['total_cost'], 160)
+
+    def test_errors(self):
+        for data, status_code in (
+            ({'source_id': self.hub.id, 'destination_id': self.city.id + 100}, 404),
+            ({'source_id': self.city.id, 'destination_id': self.hub.id}, 404),
+            ({'source_id': self.hub.id}, 400),
+            ({'source_id': self.hub.id, 'destination_id': self.city.id, 'optimize_by': 'scenery'}, 400),
+        ):
+            with self.subTest(**data):
+                self.assertEqual(self.calculate(**data).status_code, status_code)
+
+        response = self.client.post('/api/calculate-route/', b'{not json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('JSON parse error', response.json()['detail'])
+
+        self.assertEqual(self.client.get('/api/calculate-route/').status_code, 405)
+
+    def test_session_requests_need_a_csrf_token(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        data = {'source_id': self.hub.id, 'destination_id': self.city.id}
+
+        response = self.calculate(client, **data)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('CSRF', response.json()['detail'])
+
+        token = 'a' * CSRF_SECRET_LENGTH
+        client.cookies['csrftoken'] = token
+        response = client.post('/api/calculate-route/', data, content_type='application/json',
+                               HTTP_X_CSRFTOKEN=token)
+        self.assertEqual(response.status_code, 200)
+
+    def test_token_less_clients_skip_csrf(self):
+        client = Client(enforce_csrf_checks=True)
+
+        response = self.calculate(client, source_id=self.hub.id, destination_id=self.city.id)
+        self.assertEqual(response.status_code, 200)
+
+    def test_throttled(self):
+        data = {'source_id': self.hub.id, 'destination_id': self.city.id}
+
+        with mock.patch.object(APIView, 'throttle_classes', [OneRequestThrottle]):
+            self.assertEqual(self.calculate(**data).status_code, 200)
+            response = self.calculate(**data)
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('Retry-After', response)
@@ -0,0 +1,11 @@
+"""Settings shared by the test modules, so the suite runs without Redis."""
+
+LOCMEM_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+}
+
+IN_MEMORY_CHANNEL_LAYERS = {
+    'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}
+}
+
+METRICS = ('time', 'distance', 'cost')
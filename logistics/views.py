@@ -1,22 +1,111 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import orjson
+from asgiref.sync import sync_to_async
 from rest_framework import viewsets, status
 from rest_framework.decorators import api_view, action
+from rest_framework.exceptions import APIException
 from rest_framework.response import Response
+from rest_framework.views import APIView, exception_handler
+from django.db import close_old_connections, transaction
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition, require_POST
 from celery.result import AsyncResult
+from django_fsm import TransitionNotAllowed
 from .tasks import calculate_route_async
 
+from .filters import LocationNodeFilter, PackageFilter, RouteEdgeFilter
 from .models import LocationNode, RouteEdge, Package
+from .pagination import PackageCursorPagination
+from .services.broadcast import (
+    ROUTE_VISIBLE_STATES,
+    publish_package_position,
+    publish_package_removed,
+)
 from .serializers import (
     LocationNodeSerializer,
     RouteEdgeSerializer,
     PackageSerializer,
+    LocationNodeReadSerializer,
+    RouteEdgeReadSerializer,
+    PackageReadSerializer,
     RouteCalculationRequestSerializer,
-    PackageStateTransitionSerializer
+    PackageStateTransitionSerializer,
+    serialize_location_rows,
+    serialize_route_edge_rows
+)
+from .services.graph_engine import ROUTE_CALCULATOR, get_graph_version
+
+
+# Columns PackageReadSerializer renders, for narrowing read querysets
+PACKAGE_READ_FIELDS = (
+    'tracking_id', 'state', 'weight_kg', 'description',
+    'origin__name', 'current_location__name', 'destination__name',
+    'created_at', 'updated_at', 'delivered_at',
 )
-from .services.graph_engine import RouteCalculator
 
+# Route searches run here so async views never block the event loop
+ROUTE_POOL_WORKERS = 4
+_ROUTE_POOL = ThreadPoolExecutor(max_workers=ROUTE_POOL_WORKERS, thread_name_prefix='route')
 
-class LocationNodeViewSet(viewsets.ModelViewSet):
+# Transition actions that take no arguments -> Package FSM method name;
+# move_to_location needs a location and is handled on its own
+_FSM_ACTIONS = {
+    'start_transit': 'start_transit',
+    'start_delivery': 'start_delivery',
+    'complete_delivery': 'complete_delivery',
+    'cancel': 'cancel_package',
+}
+
+# Columns each transition changes, so save() only rewrites those
+# (updated_at is auto_now and must be listed to be bumped)
+_TRANSITION_FIELDS = {
+    'start_transit': ['state', 'updated_at'],
+    'move_to_location': ['state', 'current_location', 'updated_at'],
+    'start_delivery': ['state', 'updated_at'],
+    'complete_delivery': ['state', 'delivered_at', 'updated_at'],
+    'cancel': ['state', 'updated_at'],
+}
+
+
+def _publish_route_position(package, previous_state):
+    """
+    Keep route visualization clients in step with a package transition.
+    
+    Published once the transition is committed, and robustly: the cache or
+    channel layer being down must not fail a transition already saved.
+    """
+    tracking_id = package.tracking_id
+    
+    if package.state in ROUTE_VISIBLE_STATES:
+        # Entering transit puts the package on the map where it stands
+        location = package.current_location
+        lat, lon = location.latitude, location.longitude
+        transaction.on_commit(
+            lambda: publish_package_position(tracking_id, lat, lon), robust=True
+        )
+    elif previous_state in ROUTE_VISIBLE_STATES:
+        # Delivered or cancelled
+        transaction.on_commit(lambda: publish_package_removed(tracking_id), robust=True)
+
+
+class ReadSerializerMixin:
+    """
+    Use a lightweight read-only serializer for list/retrieve, keeping the
+    ModelSerializer for actions that validate input.
+    """
+    read_serializer_class = None
+    
+    def get_serializer_class(self):
+        if self.action in ('list', 'retrieve') and self.read_serializer_class:
+            return self.read_serializer_class
+        return super().get_serializer_class()
+
+
+class LocationNodeViewSet(ReadSerializerMixin, viewsets.ModelViewSet):
     """
     API endpoint for managing location nodes.
     
@@ -26,69 +115,53 @@ class LocationNodeViewSet(viewsets.ModelViewSet):
     update: Update a location node
     destroy: Delete a location node
     """
-    queryset = LocationNode.objects.all()
+    queryset = LocationNode.objects.order_by('name')
     serializer_class = LocationNodeSerializer
+    read_serializer_class = LocationNodeReadSerializer
+    filterset_class = LocationNodeFilter
     
-    def get_queryset(self):
-        queryset = LocationNode.objects.all()
-        
-        # Filter by node type if provided
-        node_type = self.request.query_params.get('type', None)
-        if node_type:
-            queryset = queryset.filter(node_type=node_type)
-        
-        # Filter by active status
-        is_active = self.request.query_params.get('active', None)
-        if is_active is not None:
-            queryset = queryset.filter(is_active=is_active.lower() == 'true')
-        
-        return queryset.order_by('name')
+    def list(self, request, *args, **kwargs):
+        # Rendered from values() rows; no model instances per location
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response(serialize_location_rows(queryset))
 
 
-class RouteEdgeViewSet(viewsets.ModelViewSet):
+class RouteEdgeViewSet(ReadSerializerMixin, viewsets.ModelViewSet):
     """
     API endpoint for managing route edges.
     """
-    queryset = RouteEdge.objects.all()
+    queryset = RouteEdge.objects.select_related(
+        'source', 'destination'
+    ).order_by('source__name', 'destination__name')
     serializer_class = RouteEdgeSerializer
+    read_serializer_class = RouteEdgeReadSerializer
+    filterset_class = RouteEdgeFilter
     
-    def get_queryset(self):
-        queryset = RouteEdge.objects.select_related('source', 'destination')
-        
-        # Filter by status if provided
-        route_status = self.request.query_params.get('status', None)
-        if route_status:
-            queryset = queryset.filter(status=route_status)
-        
-        # Filter by source location
-        source_id = self.request.query_params.get('source', None)
-        if source_id:
-            queryset = queryset.filter(source_id=source_id)
-        
-        return queryset.order_by('source__name', 'destination__name')
+    def list(self, request, *args, **kwargs):
+        # Rendered from values() rows; no model instances per edge
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response(serialize_route_edge_rows(queryset))
 
 
-class PackageViewSet(viewsets.ModelViewSet):
+class PackageViewSet(ReadSerializerMixin, viewsets.ModelViewSet):
     """
     API endpoint for managing packages.
     """
     queryset = Package.objects.all()
     serializer_class = PackageSerializer
+    read_serializer_class = PackageReadSerializer
+    pagination_class = PackageCursorPagination
+    filterset_class = PackageFilter
     
     def get_queryset(self):
         queryset = Package.objects.select_related(
             'origin', 'current_location', 'destination'
         )
         
-        # Filter by state if provided
-        package_state = self.request.query_params.get('state', None)
-        if package_state:
-            queryset = queryset.filter(state=package_state)
-        
-        # Filter by tracking ID
-        tracking_id = self.request.query_params.get('tracking_id', None)
-        if tracking_id:
-            queryset = queryset.filter(tracking_id=tracking_id)
+        # Reads only need what PackageReadSerializer renders; writes and
+        # transitions keep full rows so save() persists every field
+        if self.action in ('list', 'retrieve'):
+            queryset = queryset.only(*PACKAGE_READ_FIELDS)
         
         return queryset.order_by('-created_at')
     
@@ -100,6 +173,8 @@ class PackageViewSet(viewsets.ModelViewSet):
         POST /api/packages/{id}/transition/
         Body: {"action": "start_transit", "new_location_id": 2}
         """
+        # get_object() filters get_queryset(), so the three locations are
+        # joined into this one query for the response below
         package = self.get_object()
         serializer = PackageStateTransitionSerializer(data=request.data)
         
@@ -112,41 +187,97 @@ class PackageViewSet(viewsets.ModelViewSet):
         action_name = serializer.validated_data['action']
         new_location_id = serializer.validated_data.get('new_location_id')
         
+        if action_name == 'move_to_location':
+            if not new_location_id:
+                return Response(
+                    {'error': 'new_location_id required for move_to_location'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            # Only the name is rendered back, and the coordinates published
+            new_location = get_object_or_404(
+                LocationNode.objects.only('id', 'name', 'node_type', 'latitude', 'longitude'),
+                id=new_location_id
+            )
+        
+        previous_state = package.state
+        
         try:
             # Execute the FSM transition
-            if action_name == 'start_transit':
-                package.start_transit()
-            elif action_name == 'move_to_location':
-                if not new_location_id:
-                    return Response(
-                        {'error': 'new_location_id required for move_to_location'},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-                new_location = get_object_or_404(LocationNode, id=new_location_id)
+            if action_name == 'move_to_location':
                 package.move_to_location(new_location)
-            elif action_name == 'start_delivery':
-                package.start_delivery()
-            elif action_name == 'complete_delivery':
-                package.complete_delivery()
-            elif action_name == 'cancel':
-                package.cancel_package()
+            else:
+                getattr(package, _FSM_ACTIONS[action_name])()
             
-            package.save()
+            package.save(update_fields=_TRANSITION_FIELDS[action_name])
+            _publish_route_position(package, previous_state)
             
+            # The in-memory package is current (the FSM only touches its own
+            # fields and current_location), so serialize it without a reload
             return Response(
-                PackageSerializer(package).data,
+                self.get_serializer(package).data,
                 status=status.HTTP_200_OK
             )
             
-        except Exception as e:
+        except TransitionNotAllowed:
             return Response(
-                {'error': f'Transition failed: {str(e)}'},
+                {'error': 'Transition failed: action not allowed in the current state'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
 
-@api_view(['POST'])
-def calculate_route(request):
+def _json_response(data, status_code):
+    return HttpResponse(orjson.dumps(data), status=status_code, content_type='application/json')
+
+
+def _check_api_policy(request):
+    """
+    Run DRF's authentication, permission and throttle checks for a plain view.
+    
+    Mirrors APIView.initial(), so session-authenticated requests get the
+    same CSRF enforcement as the DRF views while token-less API clients
+    are let through.
+    
+    Returns:
+        An error response, or None if the request may proceed
+    """
+    # Buffer the body first: the CSRF check parses the request stream
+    _ = request.body
+    
+    view = APIView()
+    view.args, view.kwargs = (), {}
+    view.request = view.initialize_request(request)
+    view.headers = view.default_response_headers
+    try:
+        view.initial(view.request)
+    except APIException as exc:
+        response = exception_handler(exc, view.get_exception_handler_context())
+        error = _json_response(response.data, response.status_code)
+        # WWW-Authenticate, Retry-After; the unrendered Response's
+        # Content-Type is Django's text/html default
+        for header, value in response.items():
+            if header != 'Content-Type':
+                error[header] = value
+        return error
+    return None
+
+
+def _calculate_in_pool(source_id, destination_id, optimize_by):
+    try:
+        return ROUTE_CALCULATOR.calculate_shortest_path(
+            source_id=source_id,
+            destination_id=destination_id,
+            optimize_by=optimize_by
+        )
+    finally:
+        # Pool threads live outside the request cycle; don't leak connections
+        close_old_connections()
+
+
+# Exempt from the CSRF middleware like every DRF view; _check_api_policy
+# applies the CSRF check to session-authenticated requests instead
+@csrf_exempt
+@require_POST
+async def calculate_route(request):
     """
     Calculate the optimal route between two locations.
     
@@ -156,36 +287,67 @@ def calculate_route(request):
         "destination_id": 5,
         "optimize_by": "time"  # optional: time, distance, or cost
     }
+    
+    A plain async Django view (DRF 3.14 views are sync-only): the search
+    runs on _ROUTE_POOL so the worker keeps serving other requests, and
+    the DRF auth/permission/throttle policy is applied by hand. For very
+    large graphs use /api/calculate-route-async/ instead.
     """
-    serializer = RouteCalculationRequestSerializer(data=request.data)
+    denied = await sync_to_async(_check_api_policy)(request)
+    if denied is not None:
+        return denied
+    
+    try:
+        data = orjson.loads(request.body)
+    except orjson.JSONDecodeError as e:
+        return _json_response({'detail': f'JSON parse error - {e}'}, status.HTTP_400_BAD_REQUEST)
+    
+    serializer = RouteCalculationRequestSerializer(data=data)
     
     if not serializer.is_valid():
-        return Response(
-            serializer.errors,
-            status=status.HTTP_400_BAD_REQUEST
-        )
+        return _json_response(serializer.errors, status.HTTP_400_BAD_REQUEST)
     
     source_id = serializer.validated_data['source_id']
     destination_id = serializer.validated_data['destination_id']
     optimize_by = serializer.validated_data.get('optimize_by', 'time')
     
     # Use the graph engine to calculate route
-    calculator = RouteCalculator()
-    result = calculator.calculate_shortest_path(
-        source_id=source_id,
-        destination_id=destination_id,
-        optimize_by=optimize_by
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(
+        _ROUTE_POOL, _calculate_in_pool, source_id, destination_id, optimize_by
     )
     
     if result['status'] == 'error':
-        return Response(
-            result,
-            status=status.HTTP_404_NOT_FOUND
-        )
+        return _json_response(result, status.HTTP_404_NOT_FOUND)
     
-    return Response(result, status=status.HTTP_200_OK)
+    return _json_response(result, status.HTTP_200_OK)
+
+
+def _reachable_etag(request, location_id):
+    # Reachability only changes with the route network; unknown or inactive
+    # locations get their 404 without an ETag
+    ROUTE_CALCULATOR.build_graph()
+    if location_id not in ROUTE_CALCULATOR.node_index:
+        return None
+    return f'reachable-{location_id}-v{ROUTE_CALCULATOR.graph_version}'
+
+
+def _tracking_etag(request, tracking_id):
+    # The package row plus the network its remaining route is computed on
+    updated_at = Package.objects.filter(tracking_id=tracking_id).values_list(
+        'updated_at', flat=True
+    ).first()
+    if updated_at is None:
+        return None
+    try:
+        version = get_graph_version()
+    except Exception:
+        # Without the version the ETag can't follow network changes
+        return None
+    return f'{tracking_id}-{updated_at.timestamp()}-v{version}'
 
 
+@condition(etag_func=_reachable_etag)
 @api_view(['GET'])
 def get_reachable_destinations(request, location_id):
     """
@@ -193,8 +355,7 @@ def get_reachable_destinations(request, location_id):
     
     GET /api/locations/{location_id}/reachable/
     """
-    calculator = RouteCalculator()
-    result = calculator.get_all_routes_from_location(location_id)
+    result = ROUTE_CALCULATOR.get_all_routes_from_location(location_id)
     
     if result['status'] == 'error':
         return Response(
@@ -205,6 +366,7 @@ def get_reachable_destinations(request, location_id):
     return Response(result, status=status.HTTP_200_OK)
 
 
+@condition(etag_func=_tracking_etag)
 @api_view(['GET'])
 def track_package(request, tracking_id):
     """
@@ -215,13 +377,16 @@ def track_package(request, tracking_id):
     try:
         package = Package.objects.select_related(
             'origin', 'current_location', 'destination'
-        ).get(tracking_id=tracking_id)
+        ).only(*PACKAGE_READ_FIELDS).get(tracking_id=tracking_id)
         
-        # Calculate route if package is in transit
+        # Calculate route if package is in transit and not already there
         route_info = None
-        if package.state in ['pending', 'in_transit', 'out_for_delivery']:
-            calculator = RouteCalculator()
-            route_result = calculator.calculate_shortest_path(
+        if (
+            package.state in ['pending', 'in_transit', 'out_for_delivery']
+            and package.current_location_id
+            and package.current_location_id != package.destination_id
+        ):
+            route_result = ROUTE_CALCULATOR.calculate_shortest_path(
                 source_id=package.current_location_id,
                 destination_id=package.destination_id,
                 optimize_by='time'
@@ -230,7 +395,7 @@ def track_package(request, tracking_id):
                 route_info = route_result['route']
         
         return Response({
-            'package': PackageSerializer(package).data,
+            'package': PackageReadSerializer(package).data,
             'route': route_info
         }, status=status.HTTP_200_OK)
         
@@ -244,7 +409,8 @@ def track_package(request, tracking_id):
 def calculate_route_async_view(request):
     """
     Async route calculation - returns task ID immediately.
-    Client can poll /api/task-status/{task_id}/ for result.
+    Client can subscribe to ws/tasks/{task_id}/ to have the result pushed,
+    or poll /api/task-status/{task_id}/ for it.
     
     POST /api/calculate-route-async/
     Body: {
@@ -271,7 +437,8 @@ def calculate_route_async_view(request):
     return Response({
         'task_id': task.id,
         'status': 'processing',
-        'check_status_url': f'/api/task-status/{task.id}/'
+        'check_status_url': f'/api/task-status/{task.id}/',
+        'websocket_url': f'/ws/tasks/{task.id}/'
     }, status=status.HTTP_202_ACCEPTED)
 
 
@@ -282,31 +449,34 @@ def task_status(request, task_id):
     
     GET /api/task-status/{task_id}/
     """
-    task = AsyncResult(task_id)
+    # One backend read; task.state / task.info / task.result would each
+    # fetch the task's metadata again while it is still running
+    meta = AsyncResult(task_id).backend.get_task_meta(task_id)
+    task_state = meta['status']
     
-    if task.state == 'PENDING':
+    if task_state == 'PENDING':
         response = {
-            'state': task.state,
+            'state': task_state,
             'status': 'Task is waiting to be processed'
         }
-    elif task.state == 'PROCESSING':
+    elif task_state == 'PROCESSING':
         response = {
-            'state': task.state,
-            'status': task.info.get('status', 'Processing...')
+            'state': task_state,
+            'status': (meta['result'] or {}).get('status', 'Processing...')
         }
-    elif task.state == 'SUCCESS':
+    elif task_state == 'SUCCESS':
         response = {
-            'state': task.state,
-            'result': task.result
+            'state': task_state,
+            'result': meta['result']
         }
-    elif task.state == 'FAILURE':
+    elif task_state == 'FAILURE':
         response = {
-            'state': task.state,
-            'error': str(task.info)
+            'state': task_state,
+            'error': str(meta['result'])
         }
     else:
         response = {
-            'state': task.state,
+            'state': task_state,
             'status': 'Unknown state'
         }
     
@@ -1,28 +1,32 @@
-import websocket
-import json
-
-def on_message(ws, message):
-    print("Received:", message)
-
-def on_error(ws, error):
-    print("Error:", error)
-
-def on_close(ws, close_status_code, close_msg):
-    print("### Connection closed ###")
-
-def on_open(ws):
-    print("### Connected to WebSocket ###")
-    # Request update
-    ws.send(json.dumps({"type": "request_update"}))
-
-# Connect to package tracking
-ws = websocket.WebSocketApp(
-    "ws://127.0.0.1:8000/ws/track/PKG-F44B72572275/",
-    on_open=on_open,
-    on_message=on_message,
-    on_error=on_error,
-    on_close=on_close
-)
-
-print("Attempting to connect to WebSocket...")
-ws.run_forever()
+import asyncio
+import sys
+
+import msgpack
+import websockets
+
+# Usage: python test_websocket.py [TRACKING_ID] [CLIENTS]
+TRACKING_ID = sys.argv[1] if len(sys.argv) > 1 else "PKG-F44B72572275"
+CLIENTS = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+
+URI = f"ws://127.0.0.1:8000/ws/track/{TRACKING_ID}/"
+
+
+async def client(uri, client_id):
+    # The 'msgpack' subprotocol switches the consumer to binary frames
+    async with websockets.connect(uri, subprotocols=["msgpack"]) as ws:
+        print(f"### Client {client_id} connected ###")
+        # Request update
+        await ws.send(msgpack.packb({"type": "request_update"}))
+
+        async for message in ws:
+            print(f"Client {client_id} received:", msgpack.unpackb(message))
+
+    print(f"### Client {client_id} connection closed ###")
+
+
+async def main():
+    print(f"Attempting to connect {CLIENTS} client(s) to WebSocket...")
+    await asyncio.gather(*(client(URI, i) for i in range(CLIENTS)))
+
+
+asyncio.run(main())